@@ -67,6 +67,7 @@ def create_initial_app_state() -> Dict[str, Any]:
         "products_list": initial_products,
         "questions_config": initial_questions_config,
         "current_azure_settings": initial_settings,
+        "truncation_cache": {},
     }
 
 
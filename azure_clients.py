@@ -1,6 +1,7 @@
 """
 Handles the initialization of Azure service clients and LLM calls.
 """
+import threading
 from typing import Any, Dict, List, Optional
 
 from azure.ai.documentintelligence import DocumentIntelligenceClient
@@ -11,17 +12,25 @@ from config import get_azure_config, logger
 
 _azure_openai_client: Optional[AzureOpenAI] = None
 _document_intelligence_client: Optional[DocumentIntelligenceClient] = None
+_clients_lock = threading.Lock()
 
 
-def get_azure_openai_client_instance() -> Optional[AzureOpenAI]:
-    """Initializes and returns a singleton AzureOpenAI client instance."""
+def get_openai_client() -> Optional[AzureOpenAI]:
+    """Returns the shared AzureOpenAI client, building it on first use from the current settings."""
     global _azure_openai_client
-    config = get_azure_config()
-    if not config.get("azure_openai_endpoint") or not config.get("azure_openai_api_key"):
-        logger.error("Azure OpenAI endpoint or API key is not configured.")
-        return None
+    client = _azure_openai_client
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        if _azure_openai_client is not None:
+            return _azure_openai_client
+
+        config = get_azure_config()
+        if not config.get("azure_openai_endpoint") or not config.get("azure_openai_api_key"):
+            logger.error("Azure OpenAI endpoint or API key is not configured.")
+            return None
 
-    if _azure_openai_client is None:
         try:
             _azure_openai_client = AzureOpenAI(
                 azure_endpoint=config["azure_openai_endpoint"],
@@ -32,18 +41,25 @@ def get_azure_openai_client_instance() -> Optional[AzureOpenAI]:
         except Exception as e:
             logger.error(f"Failed to initialize Azure OpenAI client: {e}")
             _azure_openai_client = None
-    return _azure_openai_client
+        return _azure_openai_client
 
 
-def get_document_intelligence_client_instance() -> Optional[DocumentIntelligenceClient]:
-    """Initializes and returns a singleton DocumentIntelligenceClient instance."""
+def get_di_client() -> Optional[DocumentIntelligenceClient]:
+    """Returns the shared DocumentIntelligenceClient, building it on first use from the current settings."""
     global _document_intelligence_client
-    config = get_azure_config()
-    if not config.get("azure_document_intelligence_endpoint") or not config.get("azure_document_intelligence_key"):
-        logger.error("Azure Document Intelligence endpoint or key is not configured.")
-        return None
+    client = _document_intelligence_client
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        if _document_intelligence_client is not None:
+            return _document_intelligence_client
+
+        config = get_azure_config()
+        if not config.get("azure_document_intelligence_endpoint") or not config.get("azure_document_intelligence_key"):
+            logger.error("Azure Document Intelligence endpoint or key is not configured.")
+            return None
 
-    if _document_intelligence_client is None:
         try:
             _document_intelligence_client = DocumentIntelligenceClient(
                 endpoint=config["azure_document_intelligence_endpoint"],
@@ -53,7 +69,19 @@ def get_document_intelligence_client_instance() -> Optional[DocumentIntelligence
         except Exception as e:
             logger.error(f"Failed to initialize Document Intelligence client: {e}")
             _document_intelligence_client = None
-    return _document_intelligence_client
+        return _document_intelligence_client
+
+
+def invalidate_clients() -> None:
+    """
+    Drops the shared clients so the next use rebuilds them from the current settings.
+    The old clients are not closed: calls still running on them finish normally and
+    their connection pools are released once the last reference goes away.
+    """
+    global _azure_openai_client, _document_intelligence_client
+    with _clients_lock:
+        _azure_openai_client = None
+        _document_intelligence_client = None
 
 
 def call_llm(
@@ -76,7 +104,7 @@ def call_llm(
     Returns:
         The content of the LLM's response, or None if an error occurs.
     """
-    client = get_azure_openai_client_instance()
+    client = get_openai_client()
     if not client:
         logger.error("LLM client not available for call_llm.")
         return None
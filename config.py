@@ -26,12 +26,24 @@ AZURE_OPENAI_NONREASONING_MODEL_DEPLOYMENT = os.getenv(
     "AZURE_OPENAI_NONREASONING_MODEL_DEPLOYMENT", AZURE_OPENAI_REASONING_MODEL_DEPLOYMENT
 )
 
+# Context windows (tokens) of the deployed models; defaults match o4-mini and gpt-4o class models.
+AZURE_OPENAI_REASONING_MODEL_CONTEXT_TOKENS = int(os.getenv("AZURE_OPENAI_REASONING_MODEL_CONTEXT_TOKENS", "200000"))
+AZURE_OPENAI_NONREASONING_MODEL_CONTEXT_TOKENS = int(os.getenv(
+    "AZURE_OPENAI_NONREASONING_MODEL_CONTEXT_TOKENS",
+    str(AZURE_OPENAI_REASONING_MODEL_CONTEXT_TOKENS)
+    if AZURE_OPENAI_NONREASONING_MODEL_DEPLOYMENT == AZURE_OPENAI_REASONING_MODEL_DEPLOYMENT else "128000"
+))
+
 AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT = os.getenv("AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT")
 AZURE_DOCUMENT_INTELLIGENCE_KEY = os.getenv("AZURE_DOCUMENT_INTELLIGENCE_KEY")
 
+# Upper bound on products extracted in parallel; keep within the deployment's RPM/TPM budget.
+EXTRACTION_MAX_CONCURRENCY = int(os.getenv("EXTRACTION_MAX_CONCURRENCY", "8"))
+
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
 PRODUCTS_DIR = os.path.join(DATA_DIR, "insurance_products")
 EXTRACTED_DATA_DIR = os.path.join(DATA_DIR, "extracted_data")
+DI_CACHE_DIR = os.path.join(DATA_DIR, "_di_cache")
 QUESTIONS_CONFIG_PATH = os.path.join(DATA_DIR, "questions_config.json")
 SETTINGS_PATH = os.path.join(DATA_DIR, "settings.json")
 
@@ -81,6 +93,7 @@ def get_default_questions() -> List[str]:
 os.makedirs(DATA_DIR, exist_ok=True)
 os.makedirs(PRODUCTS_DIR, exist_ok=True)
 os.makedirs(EXTRACTED_DATA_DIR, exist_ok=True)
+os.makedirs(DI_CACHE_DIR, exist_ok=True)
 
 def get_azure_config() -> Dict[str, str]:
     """Returns the current Azure configurations, loaded from settings.json or .env."""
@@ -11,12 +11,15 @@ from typing import Any, Dict, List, Optional, Tuple
 from azure_clients import call_llm
 from config import AZURE_OPENAI_REASONING_MODEL_DEPLOYMENT, logger, PRODUCTS_DIR
 from local_storage import load_markdown_page, load_product_config
-from prompts import (EXTRACTION_SYSTEM_PROMPT_TEMPLATE,
+from prompts import (BATCH_EXTRACTION_PRODUCT_DOCUMENT_TEMPLATE,
+                     BATCH_EXTRACTION_USER_PROMPT_TEMPLATE,
+                     EXTRACTION_SYSTEM_PROMPT_TEMPLATE,
                      EXTRACTION_USER_PROMPT_TEMPLATE,
                      SELF_CORRECTION_SYSTEM_PROMPT,
                      SELF_CORRECTION_USER_PROMPT_TEMPLATE)
 
 MAX_MARKDOWN_CONTEXT_CHARS = 280000
+MAX_BATCH_PRODUCTS = 4
 MAX_LLM_RETRIES = 3
 LLM_RETRY_DELAY_SECONDS = 5
 
@@ -49,12 +52,24 @@ def _call_llm_with_retry(
     return None
 
 
-def _get_full_markdown_for_product(product_name: str) -> Optional[str]:
+def _product_config_for(
+    product_name: str, product_configs: Optional[Dict[str, Optional[Dict[str, Any]]]] = None
+) -> Optional[Dict[str, Any]]:
+    """Returns the product's config from product_configs when prefetched there, else loads it from disk."""
+    if product_configs is not None and product_name in product_configs:
+        return product_configs[product_name]
+    from utils import clean_filename
+    return load_product_config(clean_filename(product_name))
+
+
+def _get_full_markdown_for_product(
+    product_name: str, product_configs: Optional[Dict[str, Optional[Dict[str, Any]]]] = None
+) -> Optional[str]:
     """Loads and concatenates all markdown content for a product."""
     from utils import clean_filename
 
     safe_product_name = clean_filename(product_name)
-    product_config = load_product_config(safe_product_name)
+    product_config = _product_config_for(product_name, product_configs)
 
     if not product_config:
         logger.error(f"No config found for product: {product_name} (safe name: {safe_product_name})")
@@ -93,6 +108,31 @@ def _get_full_markdown_for_product(product_name: str) -> Optional[str]:
     return full_md_content
 
 
+def get_markdown_signature(
+    product_name: str, product_configs: Optional[Dict[str, Optional[Dict[str, Any]]]] = None
+) -> Optional[Tuple[Tuple[str, Optional[int], Optional[int]], ...]]:
+    """
+    Returns a cheap fingerprint of a product's markdown pages: (path, mtime_ns, size)
+    for every page, using only stat calls. None if the product has no markdown config.
+    """
+    product_config = _product_config_for(product_name, product_configs)
+    if not product_config or 'markdown_document_infos' not in product_config:
+        return None
+
+    signature: List[Tuple[str, Optional[int], Optional[int]]] = []
+    for doc_info in product_config['markdown_document_infos']:
+        page_paths = doc_info.get('markdown_pages_paths_absolute', []) or doc_info.get('markdown_pages_paths', [])
+        for page_path in page_paths:
+            if not page_path:
+                continue
+            try:
+                stat_result = os.stat(page_path)
+                signature.append((page_path, stat_result.st_mtime_ns, stat_result.st_size))
+            except OSError:
+                signature.append((page_path, None, None))
+    return tuple(signature)
+
+
 def check_document_size(product_name: str) -> Tuple[bool, int]:
     """Checks if a product's markdown content exceeds the context limit."""
     product_markdown = _get_full_markdown_for_product(product_name)
@@ -118,13 +158,15 @@ def extract_answers_for_product(
     product_name: str,
     questions_config: Dict[str, Any],
     extract_by_category: bool = True,
-    model_choice: str = AZURE_OPENAI_REASONING_MODEL_DEPLOYMENT
+    model_choice: str = AZURE_OPENAI_REASONING_MODEL_DEPLOYMENT,
+    product_configs: Optional[Dict[str, Optional[Dict[str, Any]]]] = None
 ) -> Optional[Dict[str, Any]]:
     """
     Extracts answers for all configured questions for a single product.
+    product_configs may hold already-loaded product configs keyed by product name.
     """
     logger.info(f"Starting answer extraction for product: {product_name} (by_category={extract_by_category}) using model {model_choice}.")
-    product_markdown_full = _get_full_markdown_for_product(product_name)
+    product_markdown_full = _get_full_markdown_for_product(product_name, product_configs)
     if not product_markdown_full:
         logger.error(f"No markdown content for product {product_name}. Cannot extract.")
         return None
@@ -208,6 +250,155 @@ def extract_answers_for_product(
     return {"product_name": product_name, "answers": all_answers_for_product}
 
 
+def plan_extraction_batches(
+    product_names: List[str],
+    max_prompt_chars: int = MAX_MARKDOWN_CONTEXT_CHARS,
+    max_batch_size: int = MAX_BATCH_PRODUCTS,
+    product_configs: Optional[Dict[str, Optional[Dict[str, Any]]]] = None
+) -> List[List[str]]:
+    """
+    Groups products so that each group's combined markdown fits into one prompt.
+    Sizes come from the page files' on-disk sizes (stat only). Products that exceed
+    the budget on their own, or whose size is unknown, get a group of their own.
+    product_configs may hold already-loaded product configs keyed by product name.
+    """
+    batches: List[List[str]] = []
+    current_batch: List[str] = []
+    current_size = 0
+
+    for product_name in product_names:
+        signature = get_markdown_signature(product_name, product_configs)
+        if not signature or any(size is None for _, _, size in signature):
+            batches.append([product_name])
+            continue
+
+        product_size = sum(size for _, _, size in signature)
+        if product_size > max_prompt_chars:
+            batches.append([product_name])
+            continue
+
+        if current_batch and (current_size + product_size > max_prompt_chars or len(current_batch) >= max_batch_size):
+            batches.append(current_batch)
+            current_batch, current_size = [], 0
+        current_batch.append(product_name)
+        current_size += product_size
+
+    if current_batch:
+        batches.append(current_batch)
+    return batches
+
+
+def extract_answers_for_products_batched(
+    product_names: List[str],
+    questions_config: Dict[str, Any],
+    model_choice: str = AZURE_OPENAI_REASONING_MODEL_DEPLOYMENT,
+    max_prompt_chars: int = MAX_MARKDOWN_CONTEXT_CHARS,
+    product_configs: Optional[Dict[str, Optional[Dict[str, Any]]]] = None
+) -> Dict[str, Optional[Dict[str, Any]]]:
+    """
+    Extracts answers for a group of products (see plan_extraction_batches) with one
+    LLM call per category for the whole group. Single products, and groups whose
+    markdown turns out not to fit, fall back to extract_answers_for_product.
+    product_configs may hold already-loaded product configs keyed by product name.
+    """
+    if len(product_names) == 1:
+        name = product_names[0]
+        return {name: extract_answers_for_product(
+            name, questions_config, extract_by_category=True, model_choice=model_choice, product_configs=product_configs
+        )}
+
+    results: Dict[str, Optional[Dict[str, Any]]] = {}
+    markdown_by_product: Dict[str, str] = {}
+    for product_name in product_names:
+        product_markdown = _get_full_markdown_for_product(product_name, product_configs)
+        if product_markdown:
+            markdown_by_product[product_name] = product_markdown
+        else:
+            logger.error(f"No markdown content for product {product_name}. Cannot extract.")
+            results[product_name] = None
+
+    if sum(len(md) for md in markdown_by_product.values()) > max_prompt_chars or len(markdown_by_product) < 2:
+        for product_name in markdown_by_product:
+            results[product_name] = extract_answers_for_product(
+                product_name, questions_config, extract_by_category=True, model_choice=model_choice,
+                product_configs=product_configs
+            )
+        return results
+
+    batch_names = list(markdown_by_product)
+    logger.info(f"Starting batched answer extraction for products: {batch_names} using model {model_choice}.")
+    answers_by_product: Dict[str, List[Dict[str, Any]]] = {name: [] for name in batch_names}
+    categories = questions_config.get("categories", [])
+    all_questions = questions_config.get("questions", [])
+
+    if not categories or not all_questions:
+        logger.warning(f"No categories or questions configured for {batch_names}.")
+        results.update({name: {"product_name": name, "answers": []} for name in batch_names})
+        return results
+
+    products_documents_str = "\n".join(
+        BATCH_EXTRACTION_PRODUCT_DOCUMENT_TEMPLATE.format(product_name=name, markdown=markdown_by_product[name])
+        for name in batch_names
+    )
+    product_names_str = ", ".join(f'"{name}"' for name in batch_names)
+
+    for category in categories:
+        questions_for_category = [
+            q for q in all_questions if category in q.get("applies_to_categories", [])
+        ]
+        if not questions_for_category:
+            logger.info(f"No questions for category '{category}'. Skipping.")
+            continue
+
+        prompt_questions_str = "\n".join(
+            [f"{i+1}. (ID: {q['id']}) {q['text']}" for i, q in enumerate(questions_for_category)]
+        )
+        system_prompt = EXTRACTION_SYSTEM_PROMPT_TEMPLATE.format(category=category)
+        user_prompt = BATCH_EXTRACTION_USER_PROMPT_TEMPLATE.format(
+            category=category,
+            products_documents_str=products_documents_str,
+            prompt_questions_str=prompt_questions_str,
+            product_names_str=product_names_str
+        )
+        messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}]
+
+        response_str = _call_llm_with_retry(messages, model_choice)
+        answers_json: Dict[str, Any] = {}
+        error_answer, error_status = None, None
+        if not response_str:
+            logger.error(f"Batched LLM call failed for category '{category}', products {batch_names}.")
+            error_answer, error_status = "Error: LLM extraction failed", "error_llm"
+        else:
+            try:
+                cleaned_response_str = re.sub(r"```json\n(.*?)\n```", r"\1", response_str, flags=re.DOTALL)
+                cleaned_response_str = re.sub(r"```(.*?)\n```", r"\1", cleaned_response_str, flags=re.DOTALL)
+                answers_json = json.loads(cleaned_response_str.strip())
+                if not isinstance(answers_json, dict):
+                    raise ValueError("LLM response is not a JSON object.")
+            except (json.JSONDecodeError, ValueError) as e:
+                logger.error(f"Error parsing batched LLM response for '{category}', {batch_names}: {e}. Response: {response_str[:500]}")
+                error_answer, error_status = "Error: Parsing LLM response failed", "error_parsing"
+
+        for product_name in batch_names:
+            product_answers = answers_json.get(product_name) if error_status is None else None
+            if error_status is None and not isinstance(product_answers, dict):
+                logger.error(f"Batched response for '{category}' has no answers for product '{product_name}'.")
+            for q_dict in questions_for_category:
+                if error_status is not None:
+                    answer_text, status = error_answer, error_status
+                elif not isinstance(product_answers, dict):
+                    answer_text, status = "Error: Product missing from LLM response", "error_parsing"
+                else:
+                    answer_text, status = str(product_answers.get(q_dict['id'], "Answer not found by LLM.")), "raw"
+                answers_by_product[product_name].append({
+                    "question_id": q_dict['id'], "question_text": q_dict['text'],
+                    "answer": answer_text, "category": category, "status": status
+                })
+
+    results.update({name: {"product_name": name, "answers": answers_by_product[name]} for name in batch_names})
+    return results
+
+
 def self_correct_answers(
     product_name: str,
     extracted_answers: List[Dict[str, Any]],
@@ -269,31 +460,33 @@ def self_correct_answers(
 
 
 def apply_corrections(
-    original_answers: List[Dict[str, Any]],
+    answers_by_id: Dict[str, Dict[str, Any]],
     corrections_list: List[Dict[str, Any]],
     product_name: str
-) -> List[Dict[str, Any]]:
+) -> Dict[str, Dict[str, Any]]:
     """
-    Applies suggested corrections to the original list of answers.
+    Applies suggested corrections to answers keyed by question ID and returns the dict.
+    Corrected entries are replaced by updated copies; all other entries are left untouched.
     """
     logger.info(f"Applying {len(corrections_list)} corrections for product: {product_name}.")
-    updated_answers_map = {ans['question_id']: ans.copy() for ans in original_answers}
 
     for correction in corrections_list:
         q_id = correction.get("question_id")
         suggested_answer = correction.get("suggested_correction")
 
-        if q_id in updated_answers_map:
+        original_answer = answers_by_id.get(q_id)
+        if original_answer is not None:
             logger.info(
                 f"Applying correction for Q_ID {q_id} in {product_name}: "
-                f"'{updated_answers_map[q_id]['answer']}' -> '{suggested_answer}'"
+                f"'{original_answer['answer']}' -> '{suggested_answer}'"
             )
-            updated_answers_map[q_id]['answer'] = str(suggested_answer)
-            updated_answers_map[q_id]['status'] = "corrected"
-            updated_answers_map[q_id]['correction_reason'] = correction.get("reason", "No reason provided.")
+            corrected_answer = original_answer.copy()
+            corrected_answer['answer'] = str(suggested_answer)
+            corrected_answer['status'] = "corrected"
+            corrected_answer['correction_reason'] = correction.get("reason", "No reason provided.")
+            answers_by_id[q_id] = corrected_answer
         else:
             logger.warning(f"Correction for non-existent Q_ID {q_id} in {product_name}. Ignoring.")
 
-    final_answers_list = list(updated_answers_map.values())
     logger.info(f"Finished applying corrections for {product_name}.")
-    return final_answers_list
+    return answers_by_id
@@ -1,18 +1,19 @@
 """
 Handles document processing including PDF analysis and Markdown conversion.
 """
+import hashlib
 import os
+import shutil
+import threading
 import time
 from typing import List, Optional, Tuple
 
-from azure.ai.documentintelligence import DocumentIntelligenceClient
 from azure.ai.documentintelligence.models import DocumentContentFormat
-from azure.core.credentials import AzureKeyCredential
 from azure.core.exceptions import (AzureError, ServiceRequestTimeoutError,
                                    ServiceResponseTimeoutError)
 
-from config import (AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT,
-                   AZURE_DOCUMENT_INTELLIGENCE_KEY, logger)
+from azure_clients import get_di_client
+from config import DI_CACHE_DIR, logger
 from document_intelligence_helper import (extract_page_markdown,
                                           extract_selection_marks,
                                           extract_tables_from_page,
@@ -24,6 +25,64 @@ MAX_RETRIES = 3
 RETRY_DELAY_SECONDS = 5
 
 
+def _page_number_from_filename(filename: str) -> int:
+    return int(filename[len("page_"):-len(".md")])
+
+
+def _load_pages_from_di_cache(
+    digest: str, product_name: str, cleaned_doc_name: str
+) -> Optional[Tuple[List[str], List[str]]]:
+    """
+    Copies cached markdown pages for a PDF (by content hash) into the product's directory.
+    Returns (page_paths, page_contents), or None on a cache miss.
+    """
+    cache_dir = os.path.join(DI_CACHE_DIR, digest)
+    if not os.path.isdir(cache_dir):
+        return None
+
+    page_files = sorted(
+        (f for f in os.listdir(cache_dir) if f.startswith("page_") and f.endswith(".md")),
+        key=_page_number_from_filename
+    )
+    if not page_files:
+        return None
+
+    markdown_page_paths: List[str] = []
+    markdown_page_contents: List[str] = []
+    try:
+        for page_file in page_files:
+            with open(os.path.join(cache_dir, page_file), "r", encoding="utf-8") as f:
+                page_content = f.read()
+            saved_path = save_markdown_page(
+                product_name, cleaned_doc_name, _page_number_from_filename(page_file) - 1, page_content
+            )
+            if not saved_path:
+                return None
+            markdown_page_paths.append(saved_path)
+            markdown_page_contents.append(page_content)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not restore cached DI output {digest}: {e}")
+        return None
+    return markdown_page_paths, markdown_page_contents
+
+
+def _store_in_di_cache(digest: str, markdown_page_paths: List[str]) -> None:
+    """Stores a PDF's markdown pages under its content hash; written to a temp dir, then renamed."""
+    cache_dir = os.path.join(DI_CACHE_DIR, digest)
+    if os.path.isdir(cache_dir):
+        return
+
+    tmp_dir = f"{cache_dir}.tmp-{os.getpid()}-{threading.get_ident()}"
+    try:
+        os.makedirs(tmp_dir, exist_ok=True)
+        for page_path in markdown_page_paths:
+            shutil.copyfile(page_path, os.path.join(tmp_dir, os.path.basename(page_path)))
+        os.replace(tmp_dir, cache_dir)
+    except OSError as e:
+        logger.warning(f"Could not store DI output in cache {digest}: {e}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
 def pdf_to_markdown_pages_for_doc(
     pdf_path: str,
     product_name: str,
@@ -44,10 +103,7 @@ def pdf_to_markdown_pages_for_doc(
         - List of markdown content for each page, or None if a critical error occurred.
           Returns ([], []) if DI processes but yields no content.
     """
-    client = DocumentIntelligenceClient(
-        endpoint=AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT,
-        credential=AzureKeyCredential(AZURE_DOCUMENT_INTELLIGENCE_KEY)
-    )
+    client = get_di_client()
     if not client:
         logger.error("Document Intelligence client is not available for PDF processing.")
         return None, None
@@ -60,6 +116,12 @@ def pdf_to_markdown_pages_for_doc(
         with open(pdf_path, "rb") as f_pdf:
             document_bytes = f_pdf.read()
 
+        digest = hashlib.sha256(document_bytes).hexdigest()
+        cached_pages = _load_pages_from_di_cache(digest, product_name, cleaned_doc_name_for_saving)
+        if cached_pages is not None:
+            logger.info(f"Reusing cached Document Intelligence output for {pdf_path} ({digest[:12]}).")
+            return cached_pages
+
         poller = None
         for attempt in range(MAX_RETRIES):
             try:
@@ -122,6 +184,7 @@ def pdf_to_markdown_pages_for_doc(
 
             if markdown_page_paths:
                 logger.info(f"Extracted and saved {len(markdown_page_paths)} markdown pages for {doc_name}.")
+                _store_in_di_cache(digest, markdown_page_paths)
                 return markdown_page_paths, markdown_page_contents
 
         if result.content.strip() and not markdown_page_paths:
@@ -130,6 +193,7 @@ def pdf_to_markdown_pages_for_doc(
             saved_path = save_markdown_page(product_name, cleaned_doc_name_for_saving, 0, result.content)
             if saved_path:
                 markdown_page_paths = [saved_path]
+                _store_in_di_cache(digest, markdown_page_paths)
                 return markdown_page_paths, markdown_page_contents
 
         logger.warning(f"No processable markdown content extracted from {pdf_path}.")
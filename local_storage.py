@@ -2,22 +2,109 @@
 Handles local file storage for product configurations, markdown content,
 question configurations, extracted answers, settings, and Excel export.
 """
+import functools
 import json
 import os
 import re
-from typing import Any, Dict, List, Optional
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional, Tuple
 
 import pandas as pd
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 from config import (AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT,
                     AZURE_DOCUMENT_INTELLIGENCE_KEY, AZURE_OPENAI_API_KEY,
                     AZURE_OPENAI_API_VERSION, AZURE_OPENAI_ENDPOINT,
                     EXTRACTED_DATA_DIR, PRODUCTS_DIR, QUESTIONS_CONFIG_PATH,
                     SETTINGS_PATH, logger)
 
+EXTRACTED_DATA_SUFFIX = "_extracted.json"
+EXTRACTED_INDEX_PATH = os.path.join(EXTRACTED_DATA_DIR, "_index.json")
+_extracted_index_lock = threading.Lock()
+
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+_NEW_FILE_MODE = 0o666 & ~_UMASK
+
+
+def dumps_json_bytes(data: Any, indent: bool = False) -> bytes:
+    """Serializes data to UTF-8 JSON bytes (compact, or 2-space indented), using orjson when available."""
+    if orjson:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else None)
+    if indent:
+        return json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8")
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode("utf-8")
+
+
+def write_json_atomic(path: str, data: Any, indent: bool = True, fsync: bool = False) -> None:
+    """
+    Writes JSON to a uniquely named temp file next to path, then renames it into place,
+    so concurrent writers never share a temp file. Raises OSError.
+    """
+    payload = dumps_json_bytes(data, indent=indent)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb", buffering=0) as f:
+            f.write(payload)
+            if fsync:
+                os.fsync(f.fileno())
+        os.chmod(tmp_path, _NEW_FILE_MODE) # mkstemp creates 0600 files
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def loads_json_bytes(raw: bytes) -> Any:
+    """Parses UTF-8 JSON bytes, using orjson when available. Raises json.JSONDecodeError."""
+    if orjson:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int]]:
+    """Returns (mtime_ns, size) for a file, or None if it cannot be stat'ed."""
+    try:
+        stat_result = os.stat(path)
+    except OSError:
+        return None
+    return stat_result.st_mtime_ns, stat_result.st_size
+
+
+@functools.lru_cache(maxsize=256)
+def _read_file_bytes_cached(path: str, mtime_ns: int, size: int) -> Optional[bytes]:
+    """Reads a file's raw bytes. Keyed on mtime and size, so a rewrite is picked up on the next call."""
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except IOError as e:
+        logger.error(f"Error reading {path}: {e}")
+        return None
 
+
+def _parse_cached_json_file(path: str, signature: Tuple[int, int]) -> Optional[Any]:
+    """Parses a JSON file from the raw-bytes cache; each call returns a freshly parsed object."""
+    raw = _read_file_bytes_cached(path, *signature)
+    if raw is None:
+        return None
+    try:
+        return loads_json_bytes(raw)
+    except (json.JSONDecodeError, ValueError) as e:
+        logger.error(f"Error parsing JSON from {path}: {e}")
+        return None
+
+
+@functools.lru_cache(maxsize=1024)
 def get_product_data_dir(product_name: str) -> str:
-    """Gets the directory path for a specific product, using a cleaned name."""
+    """Gets the directory path for a specific product, using a cleaned name (memoized; pure string work)."""
     from utils import clean_filename
     safe_product_name = clean_filename(product_name)
     product_dir = os.path.join(PRODUCTS_DIR, safe_product_name)
@@ -28,24 +115,23 @@ def get_product_data_dir(product_name: str) -> str:
 def save_product_config(
     product_name: str,
     pdf_urls: List[str],
-    original_pdf_paths: List[Optional[str]],
+    original_pdf_paths: Dict[str, Optional[str]],
     markdown_doc_infos: List[Dict[str, Any]]
 ) -> None:
-    """Saves product configuration: URLs, paths to original PDFs, and markdown document info."""
+    """Saves product configuration: URLs, paths to original PDFs (keyed by doc name), and markdown document info."""
     product_dir = get_product_data_dir(product_name)
     os.makedirs(product_dir, exist_ok=True)
     config_path = os.path.join(product_dir, "_config.json")
 
-    relative_pdf_paths = []
-    for p in original_pdf_paths:
+    relative_pdf_paths: Dict[str, str] = {}
+    for doc_name, p in original_pdf_paths.items():
         if p and os.path.exists(p):
             try:
-                rel_path = os.path.relpath(p, product_dir)
-                relative_pdf_paths.append(rel_path)
+                relative_pdf_paths[doc_name] = os.path.relpath(p, product_dir)
             except ValueError:
-                relative_pdf_paths.append(p)
+                relative_pdf_paths[doc_name] = p
         else:
-            relative_pdf_paths.append(p if p else "")
+            relative_pdf_paths[doc_name] = p if p else ""
 
     for doc_info in markdown_doc_infos:
         if 'markdown_pages_paths' in doc_info:
@@ -70,8 +156,7 @@ def save_product_config(
     }
 
     try:
-        with open(config_path, "w", encoding="utf-8") as f:
-            json.dump(config_data, f, indent=4)
+        write_json_atomic(config_path, config_data)
         logger.info(f"Saved product configuration to {config_path}")
     except IOError as e:
         logger.error(f"Error saving product config to {config_path}: {e}")
@@ -95,36 +180,39 @@ def load_product_config(product_identifier: str) -> Optional[Dict[str, Any]]:
     config_path = os.path.join(product_dir, "_config.json")
     logger.debug(f"Looking for product config at: {config_path}")
 
-    if not os.path.exists(config_path):
+    signature = _file_signature(config_path)
+    if signature is None:
         logger.warning(f"Product config file not found: {config_path}")
         return None
 
-    try:
-        with open(config_path, "r", encoding="utf-8") as f:
-            config = json.load(f)
-
-        if 'original_pdf_paths_relative' in config:
-            config['original_pdf_paths'] = [
-                os.path.abspath(os.path.join(product_dir, p)) if p else None
-                for p in config['original_pdf_paths_relative']
-            ]
-
-        if 'markdown_document_infos' in config:
-            for doc_info in config['markdown_document_infos']:
-                if 'markdown_pages_paths' in doc_info:
-                    doc_info['markdown_pages_paths_absolute'] = [
-                        os.path.abspath(os.path.join(product_dir, p)) if p else None
-                        for p in doc_info['markdown_pages_paths']
-                    ]
-                    doc_info['markdown_pages_paths'] = doc_info['markdown_pages_paths_absolute']
-
-        logger.info(f"Successfully loaded product config for {product_identifier}")
-        return config
-
-    except (IOError, json.JSONDecodeError) as e:
-        logger.error(f"Error loading product config from {config_path}: {e}")
+    config = _parse_cached_json_file(config_path, signature)
+    if config is None:
         return None
 
+    relative_pdf_paths = config.get('original_pdf_paths_relative')
+    if isinstance(relative_pdf_paths, dict):
+        config['original_pdf_paths'] = {
+            doc_name: os.path.abspath(os.path.join(product_dir, p)) if p else None
+            for doc_name, p in relative_pdf_paths.items()
+        }
+    elif relative_pdf_paths is not None:
+        config['original_pdf_paths'] = [
+            os.path.abspath(os.path.join(product_dir, p)) if p else None
+            for p in relative_pdf_paths
+        ]
+
+    if 'markdown_document_infos' in config:
+        for doc_info in config['markdown_document_infos']:
+            if 'markdown_pages_paths' in doc_info:
+                doc_info['markdown_pages_paths_absolute'] = [
+                    os.path.abspath(os.path.join(product_dir, p)) if p else None
+                    for p in doc_info['markdown_pages_paths']
+                ]
+                doc_info['markdown_pages_paths'] = doc_info['markdown_pages_paths_absolute']
+
+    logger.debug(f"Loaded product config for {product_identifier}")
+    return config
+
 
 def list_saved_products() -> List[str]:
     """Lists all product directory names for which configuration has been saved."""
@@ -183,22 +271,27 @@ def load_markdown_page(page_path: str) -> Optional[str]:
 def save_questions_config(config_data: Dict[str, Any]) -> None:
     """Saves the question configurations."""
     try:
-        with open(QUESTIONS_CONFIG_PATH, "w", encoding="utf-8") as f:
-            json.dump(config_data, f, indent=4)
+        write_json_atomic(QUESTIONS_CONFIG_PATH, config_data, fsync=True)
         logger.info(f"Question configuration saved to {QUESTIONS_CONFIG_PATH}")
     except IOError as e:
         logger.error(f"Error saving question configuration: {e}")
 
 
 def load_questions_config() -> Dict[str, Any]:
-    """Loads the question configurations, returning a default structure on failure."""
+    """
+    Loads the question configurations, returning a default structure on failure.
+    Categories are returned sorted; the questions tab relies on this to insert new ones with bisect.
+    """
     default_config = {"categories": [], "questions": []}
     if not os.path.exists(QUESTIONS_CONFIG_PATH):
         logger.info(f"Questions config file not found at {QUESTIONS_CONFIG_PATH}. Returning default.")
         return default_config
     try:
         with open(QUESTIONS_CONFIG_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
+            config_data = json.load(f)
+        if isinstance(config_data.get("categories"), list):
+            config_data["categories"].sort()
+        return config_data
     except (IOError, json.JSONDecodeError) as e:
         logger.error(f"Error loading question configuration from {QUESTIONS_CONFIG_PATH}: {e}. Returning default.")
         return default_config
@@ -208,7 +301,7 @@ def get_extracted_data_path(product_name: str) -> str:
     """Gets the file path for a product's extracted data using a cleaned name."""
     from utils import clean_filename
     safe_product_name = clean_filename(product_name)
-    return os.path.join(EXTRACTED_DATA_DIR, f"{safe_product_name}_extracted.json")
+    return os.path.join(EXTRACTED_DATA_DIR, f"{safe_product_name}{EXTRACTED_DATA_SUFFIX}")
 
 
 def save_extracted_data(product_name: str, data: Dict[str, Any]) -> None:
@@ -222,25 +315,89 @@ def save_extracted_data(product_name: str, data: Dict[str, Any]) -> None:
         logger.info(f"Saved extracted data for product: {product_name} to {filepath}")
     except IOError as e:
         logger.error(f"Error saving extracted data for {product_name}: {e}")
+        return
+
+    with _extracted_index_lock:
+        index = _load_extracted_index()
+        if index.get(os.path.basename(filepath)) != product_name:
+            index[os.path.basename(filepath)] = product_name
+            _save_extracted_index(index)
+
+
+def _load_extracted_index() -> Dict[str, str]:
+    """Loads the sidecar index mapping extracted data filenames to original product names."""
+    try:
+        with open(EXTRACTED_INDEX_PATH, "rb") as f:
+            index = loads_json_bytes(f.read())
+        return index if isinstance(index, dict) else {}
+    except FileNotFoundError:
+        return {}
+    except (IOError, json.JSONDecodeError) as e:
+        logger.warning(f"Extracted data index at {EXTRACTED_INDEX_PATH} is unreadable, rebuilding: {e}")
+        return {}
+
+
+def _save_extracted_index(index: Dict[str, str]) -> None:
+    try:
+        write_json_atomic(EXTRACTED_INDEX_PATH, index, indent=False)
+    except IOError as e:
+        logger.error(f"Error saving extracted data index to {EXTRACTED_INDEX_PATH}: {e}")
+
+
+def list_extracted_product_names() -> List[str]:
+    """
+    Lists the original product names of all extracted data files on disk.
+    Names come from the sidecar index; files written before the index existed
+    are parsed once and then recorded in it.
+    """
+    if not os.path.exists(EXTRACTED_DATA_DIR):
+        return []
+
+    with _extracted_index_lock:
+        index = _load_extracted_index()
+        index_changed = False
+        product_names: List[str] = []
+        for f_name in os.listdir(EXTRACTED_DATA_DIR):
+            if not f_name.endswith(EXTRACTED_DATA_SUFFIX):
+                continue
+            product_name = index.get(f_name)
+            if product_name is None:
+                filepath = os.path.join(EXTRACTED_DATA_DIR, f_name)
+                signature = _file_signature(filepath)
+                data = _parse_cached_json_file(filepath, signature) if signature else None
+                if data is None:
+                    continue
+                product_name = data.get("product_name_original") or \
+                    f_name[:-len(EXTRACTED_DATA_SUFFIX)].replace("_", " ").title()
+                index[f_name] = product_name
+                index_changed = True
+            product_names.append(product_name)
+
+        if index_changed:
+            _save_extracted_index(index)
+    return product_names
 
 
 def load_extracted_data(product_name: str) -> Optional[Dict[str, Any]]:
-    """Loads extracted answers for a product."""
+    """
+    Loads extracted answers for a product.
+    File contents are cached on (mtime, size) and parsed per call, so the returned
+    dict is always a fresh object.
+    """
     filepath = get_extracted_data_path(product_name)
-    if not os.path.exists(filepath):
+    signature = _file_signature(filepath)
+    if signature is None:
         logger.debug(f"Extracted data file not found for {product_name} at {filepath}")
         return None
-    try:
-        with open(filepath, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        if 'product_name_original' in data:
-            data['product_name'] = data['product_name_original']
-        elif 'product_name' not in data:
-            data['product_name'] = product_name
-        return data
-    except (IOError, json.JSONDecodeError) as e:
-        logger.error(f"Error loading extracted data for {product_name} from {filepath}: {e}")
+
+    data = _parse_cached_json_file(filepath, signature)
+    if data is None:
         return None
+    if 'product_name_original' in data:
+        data['product_name'] = data['product_name_original']
+    elif 'product_name' not in data:
+        data['product_name'] = product_name
+    return data
 
 
 def save_settings(settings: Dict[str, str]) -> None:
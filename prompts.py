@@ -78,6 +78,28 @@ Important: Answer as concisely as possible. Respond in keywords / note form. If
 Ensure all question IDs listed above are present as keys in your JSON response.
 """
 
+BATCH_EXTRACTION_USER_PROMPT_TEMPLATE = """
+Based *only* on the provided insurance document texts, answer the following questions related to the '{category}' category for EACH of the products below.
+Answer every product strictly from its own document text. If information for a question is not found, state 'Not Found' or 'Not Specified'.
+
+{products_documents_str}
+
+Questions for category '{category}':
+{prompt_questions_str}
+
+Provide your answers ONLY as a valid JSON object keyed by the exact product names listed above ({product_names_str}).
+Each product maps each question ID (e.g., "q1", "q2") to its answer (string).
+Example format: {{ "Product A": {{ "q1": "Yes", "q5": "5000 EUR" }}, "Product B": {{ "q1": "No", "q5": "" }} }}
+Important: Answer as concisely as possible. Respond in keywords / note form. If a question is not applicable, return empty string.
+
+Ensure every product name and, for each product, all question IDs listed above are present as keys in your JSON response.
+"""
+BATCH_EXTRACTION_PRODUCT_DOCUMENT_TEMPLATE = """Document Text for product '{product_name}':
+---
+{markdown}
+---
+"""
+
 SELF_CORRECTION_SYSTEM_PROMPT = "You are an expert AI assistant reviewing extracted information from insurance terms. Your goal is to identify inaccuracies or incomplete answers by cross-referencing with the original document text."
 SELF_CORRECTION_USER_PROMPT_TEMPLATE = """
 Please review the following extracted answers for the insurance product '{product_name}' against the provided document text.
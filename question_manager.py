@@ -3,16 +3,36 @@ Manages the generation and configuration of questions and categories
 for insurance product comparison using LLMs.
 """
 import json
-from typing import Any, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
 
 from azure_clients import call_llm
-from config import (AZURE_OPENAI_REASONING_MODEL_DEPLOYMENT, logger)
+from config import (AZURE_OPENAI_NONREASONING_MODEL_CONTEXT_TOKENS,
+                    AZURE_OPENAI_NONREASONING_MODEL_DEPLOYMENT,
+                    AZURE_OPENAI_REASONING_MODEL_CONTEXT_TOKENS,
+                    AZURE_OPENAI_REASONING_MODEL_DEPLOYMENT, logger)
 from prompts import (CATEGORIES_SYSTEM_PROMPT, CATEGORIES_USER_PROMPT_TEMPLATE,
                      QUESTIONS_SYSTEM_PROMPT, QUESTIONS_USER_PROMPT_TEMPLATE)
 
 MAX_PROMPT_TOKEN_APPROXIMATION = 250000
+CHARS_PER_TOKEN_ESTIMATE = 3 # conservative for markdown with tables
+SUGGESTION_OUTPUT_TOKEN_RESERVE = 32000
+SUGGESTION_PROMPT_TOKEN_OVERHEAD = 4000
 
-def _prepare_text_corpus(all_docs_content_map: Dict[str, List[str]]) -> str:
+
+def get_prompt_char_budget(model_deployment_name: str) -> int:
+    """Approximate corpus characters that fit one suggestion prompt for the given deployment's context window."""
+    if model_deployment_name == AZURE_OPENAI_REASONING_MODEL_DEPLOYMENT:
+        context_tokens = AZURE_OPENAI_REASONING_MODEL_CONTEXT_TOKENS
+    elif model_deployment_name == AZURE_OPENAI_NONREASONING_MODEL_DEPLOYMENT:
+        context_tokens = AZURE_OPENAI_NONREASONING_MODEL_CONTEXT_TOKENS
+    else:
+        return MAX_PROMPT_TOKEN_APPROXIMATION
+    usable_tokens = context_tokens - SUGGESTION_OUTPUT_TOKEN_RESERVE - SUGGESTION_PROMPT_TOKEN_OVERHEAD
+    return max(usable_tokens * CHARS_PER_TOKEN_ESTIMATE, 0) or MAX_PROMPT_TOKEN_APPROXIMATION
+
+
+def _prepare_text_corpus(all_docs_content_map: Dict[str, List[str]], max_chars: int = MAX_PROMPT_TOKEN_APPROXIMATION) -> str:
     """Combines all document content into a single string, with truncation if necessary."""
     full_text_corpus = []
     for product_name, doc_contents in all_docs_content_map.items():
@@ -21,12 +41,53 @@ def _prepare_text_corpus(all_docs_content_map: Dict[str, List[str]]) -> str:
             full_text_corpus.append(content + "\n")
 
     corpus_str = "".join(full_text_corpus)
-    if len(corpus_str) > MAX_PROMPT_TOKEN_APPROXIMATION:
-        corpus_str = corpus_str[:MAX_PROMPT_TOKEN_APPROXIMATION] + "\n... [CONTENT TRUNCATED]"
-        logger.warning(f"Full text corpus truncated to ~{MAX_PROMPT_TOKEN_APPROXIMATION} chars for LLM.")
+    if len(corpus_str) > max_chars:
+        corpus_str = corpus_str[:max_chars] + "\n... [CONTENT TRUNCATED]"
+        logger.warning(f"Full text corpus truncated to ~{max_chars} chars for LLM.")
     return corpus_str
 
 
+def _corpus_size(product_name: str, doc_contents: List[str]) -> int:
+    """Approximate character count a product contributes to the corpus built by _prepare_text_corpus."""
+    return len(product_name) + 40 + sum(len(content) + 1 for content in doc_contents)
+
+
+def _bucket_products_for_prompts(
+    all_docs_content_map: Dict[str, List[str]], max_chars: int = MAX_PROMPT_TOKEN_APPROXIMATION
+) -> List[Dict[str, List[str]]]:
+    """
+    Groups products into as few prompt-sized batches as possible (first-fit decreasing).
+    Everything fits in one batch in the common case; a product larger than max_chars
+    gets a batch of its own and is truncated by _prepare_text_corpus.
+    """
+    sizes = {name: _corpus_size(name, contents) for name, contents in all_docs_content_map.items()}
+    buckets: List[Dict[str, List[str]]] = []
+    bucket_sizes: List[int] = []
+    for product_name in sorted(sizes, key=sizes.get, reverse=True):
+        for i, bucket_size in enumerate(bucket_sizes):
+            if bucket_size + sizes[product_name] <= max_chars:
+                buckets[i][product_name] = all_docs_content_map[product_name]
+                bucket_sizes[i] += sizes[product_name]
+                break
+        else:
+            buckets.append({product_name: all_docs_content_map[product_name]})
+            bucket_sizes.append(sizes[product_name])
+    return [
+        {name: contents for name, contents in all_docs_content_map.items() if name in bucket}
+        for bucket in buckets
+    ]
+
+
+def _call_llm_for_corpora(
+    corpora: List[str], build_messages: Callable[[str], List[Dict[str, str]]], **llm_kwargs: Any
+) -> List[Optional[str]]:
+    """Issues one LLM call per corpus; a single corpus (the usual case) makes exactly one request."""
+    if len(corpora) == 1:
+        return [call_llm(build_messages(corpora[0]), **llm_kwargs)]
+    with ThreadPoolExecutor(max_workers=len(corpora)) as executor:
+        return list(executor.map(lambda corpus: call_llm(build_messages(corpus), **llm_kwargs), corpora))
+
+
 def _parse_llm_json_response(response_str: Optional[str], key_name: str) -> Optional[Any]:
     """Parses JSON response from LLM, expecting a specific key."""
     if not response_str:
@@ -53,7 +114,12 @@ def suggest_categories_and_questions(
         return {"categories": [], "questions": []}
 
     logger.info(f"Suggesting C&Q using model: {model_deployment_name}")
-    full_text_corpus = _prepare_text_corpus(all_docs_content_map)
+    prompt_char_budget = get_prompt_char_budget(model_deployment_name)
+    product_buckets = _bucket_products_for_prompts(all_docs_content_map, prompt_char_budget)
+    if len(product_buckets) > 1:
+        logger.info(f"Document corpus exceeds one prompt; using {len(product_buckets)} prompt batches "
+                    f"for {len(all_docs_content_map)} products.")
+    corpora = [_prepare_text_corpus(bucket, prompt_char_budget) for bucket in product_buckets]
 
     sample_categories_text = ""
     if sample_categories_str.strip():
@@ -62,20 +128,29 @@ def suggest_categories_and_questions(
             sample_categories_text = "Consider including these sample categories if relevant:\n" + \
                                      "\n".join([f"- {cat}" for cat in cats])
 
-    categories_user_prompt = CATEGORIES_USER_PROMPT_TEMPLATE.format(
-        sample_categories_text=sample_categories_text,
-        full_text_corpus=full_text_corpus
-    )
-    categories_messages = [
-        {"role": "system", "content": CATEGORIES_SYSTEM_PROMPT},
-        {"role": "user", "content": categories_user_prompt}
-    ]
-
-    categories_response_str = call_llm(categories_messages, model_deployment_name, json_mode=True)
-    suggested_categories_raw = _parse_llm_json_response(categories_response_str, "categories")
+    def build_categories_messages(full_text_corpus: str) -> List[Dict[str, str]]:
+        categories_user_prompt = CATEGORIES_USER_PROMPT_TEMPLATE.format(
+            sample_categories_text=sample_categories_text,
+            full_text_corpus=full_text_corpus
+        )
+        return [
+            {"role": "system", "content": CATEGORIES_SYSTEM_PROMPT},
+            {"role": "user", "content": categories_user_prompt}
+        ]
+
+    suggested_categories_raw: List[Any] = []
+    categories_parsed = False
+    for categories_response_str in _call_llm_for_corpora(
+        corpora, build_categories_messages, model_deployment_name=model_deployment_name, json_mode=True
+    ):
+        batch_categories_raw = _parse_llm_json_response(categories_response_str, "categories")
+        if not isinstance(batch_categories_raw, list):
+            logger.error(f"LLM returned malformed categories list or parsing failed. Raw: {batch_categories_raw}")
+            continue
+        categories_parsed = True
+        suggested_categories_raw.extend(batch_categories_raw)
 
-    if not isinstance(suggested_categories_raw, list):
-        logger.error(f"LLM returned malformed categories list or parsing failed. Raw: {suggested_categories_raw}")
+    if not categories_parsed:
         return None
 
     suggested_categories = sorted(list(set(
@@ -98,22 +173,38 @@ def suggest_categories_and_questions(
 
     first_category_example = suggested_categories[0] if suggested_categories else "ExampleCategory"
 
-    questions_user_prompt = QUESTIONS_USER_PROMPT_TEMPLATE.format(
-        categories_list="\n".join([f"- {cat}" for cat in suggested_categories]),
-        sample_questions_text=sample_questions_text,
-        full_text_corpus=full_text_corpus,
-        first_category_example=f'"{first_category_example}"'
-    )
-    questions_messages = [
-        {"role": "system", "content": QUESTIONS_SYSTEM_PROMPT},
-        {"role": "user", "content": questions_user_prompt}
-    ]
-
-    questions_response_str = call_llm(questions_messages, model_deployment_name, json_mode=True, max_tokens=32000)
-    questions_list_raw = _parse_llm_json_response(questions_response_str, "questions")
-
-    if not isinstance(questions_list_raw, list):
-        logger.error(f"LLM returned malformed questions list or parsing failed. Raw: {questions_list_raw}")
+    def build_questions_messages(full_text_corpus: str) -> List[Dict[str, str]]:
+        questions_user_prompt = QUESTIONS_USER_PROMPT_TEMPLATE.format(
+            categories_list="\n".join([f"- {cat}" for cat in suggested_categories]),
+            sample_questions_text=sample_questions_text,
+            full_text_corpus=full_text_corpus,
+            first_category_example=f'"{first_category_example}"'
+        )
+        return [
+            {"role": "system", "content": QUESTIONS_SYSTEM_PROMPT},
+            {"role": "user", "content": questions_user_prompt}
+        ]
+
+    questions_list_raw: List[Any] = []
+    seen_question_texts = set()
+    for questions_response_str in _call_llm_for_corpora(
+        corpora, build_questions_messages,
+        model_deployment_name=model_deployment_name, json_mode=True, max_tokens=32000
+    ):
+        batch_questions_raw = _parse_llm_json_response(questions_response_str, "questions")
+        if not isinstance(batch_questions_raw, list):
+            logger.error(f"LLM returned malformed questions list or parsing failed. Raw: {batch_questions_raw}")
+            continue
+        for q_data in batch_questions_raw:
+            q_text = q_data.get("text") if isinstance(q_data, dict) else None
+            if isinstance(q_text, str):
+                normalized_text = q_text.strip().lower()
+                if normalized_text in seen_question_texts:
+                    continue
+                seen_question_texts.add(normalized_text)
+            questions_list_raw.append(q_data)
+
+    if not questions_list_raw:
         return {"categories": suggested_categories, "questions": []}
 
     final_questions: List[Dict[str, Any]] = []
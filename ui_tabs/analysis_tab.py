@@ -3,14 +3,16 @@ import pandas as pd
 import os
 from config import logger, EXTRACTED_DATA_DIR
 from local_storage import list_saved_products, load_extracted_data, export_data_to_excel, load_questions_config
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict, Any, Iterator, Tuple, Optional
 from utils import format_error_message
 import base64
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from agent_service import ANALYSIS_TEMPLATES
 from analyzer import execute_analysis_with_agent
 from azure_clients import call_llm
 from config import AZURE_OPENAI_NONREASONING_MODEL_DEPLOYMENT
 import re
+import html
 from analysis_storage import save_analysis, list_saved_analyses, load_analysis, delete_analysis
 
 try:
@@ -18,6 +20,12 @@ try:
 except ImportError:
     _md = None
 
+# Anything that could change the rendered output of the markdown parser. Text without
+# any of these is a plain paragraph and can skip the parser entirely.
+_MD_SIGIL_RE = re.compile(r'[#*_`\[\]|]|\n\n|---|^\s*(?:[-+>]|\d+[.)])\s', re.MULTILINE)
+_MD_BATCH_SEPARATOR = "<!--§§§-->"
+MAX_CONCURRENT_ANALYSES = 4
+
 def create_analysis_tab(app_state: gr.State):
     """Creates the Gradio UI for the Analysis tab."""
 
@@ -147,111 +155,183 @@ def create_analysis_tab(app_state: gr.State):
         </div>
         """
 
-    def format_markdown_content(markdown_text: str) -> str:
-        """Convert markdown to HTML so it renders correctly inside gr.HTML."""
-        if not markdown_text:
-            return ""
+    def _md_render(markdown_text: str) -> str:
+        """Runs markdown text through the markdown parser (or the minimal fallback)."""
         try:
             if _md:
-                rendered_html = _md.markdown(
+                return _md.markdown(
                     markdown_text,
                     extensions=["tables", "fenced_code", "toc", "sane_lists"]
                 )
-            else:
-                rendered_html = (
-                    markdown_text.replace("\n", "<br>")
-                                  .replace("**", "<b>").replace("__", "<i>")
-                )
+            return (
+                markdown_text.replace("\n", "<br>")
+                              .replace("**", "<b>").replace("__", "<i>")
+            )
         except Exception as e:
             logger.error(f"Markdown render error: {e}")
-            rendered_html = markdown_text.replace("\n", "<br>")
+            return markdown_text.replace("\n", "<br>")
 
+    def _wrap_explanation(rendered_html: str) -> str:
         return f"""
         <div class='analysis-explanation'>
             {rendered_html}
         </div>
         """
 
+    def format_markdown_content(markdown_text: str) -> str:
+        """Convert markdown to HTML so it renders correctly inside gr.HTML."""
+        if not markdown_text:
+            return ""
+        if not _MD_SIGIL_RE.search(markdown_text):
+            return f"<div class='analysis-explanation'><p>{html.escape(markdown_text)}</p></div>"
+        return _wrap_explanation(_md_render(markdown_text))
+
+    def batch_format_markdown(texts: List[str]) -> List[str]:
+        """
+        Formats several explanations with a single parser run.
+        Texts are joined with a sentinel comment, rendered once, and split again.
+        """
+        results = [""] * len(texts)
+        pending: List[int] = []
+        for idx, text in enumerate(texts):
+            if text and _MD_SIGIL_RE.search(text):
+                pending.append(idx)
+            else:
+                results[idx] = format_markdown_content(text)
+
+        if not pending:
+            return results
+
+        joined = f"\n\n{_MD_BATCH_SEPARATOR}\n\n".join(texts[idx] for idx in pending)
+        pieces = _md_render(joined).split(_MD_BATCH_SEPARATOR)
+        if len(pieces) != len(pending):
+            # An unterminated block (e.g. an open code fence) swallowed a separator.
+            logger.warning("Batched markdown render lost a separator; rendering explanations individually.")
+            for idx in pending:
+                results[idx] = format_markdown_content(texts[idx])
+            return results
+
+        for idx, piece in zip(pending, pieces):
+            results[idx] = _wrap_explanation(piece.strip())
+        return results
+
+    def _build_template_section(template_name: str, results: Dict[str, Any]) -> str:
+        """Builds the plot and table HTML for one completed analysis template."""
+        section_content_parts = []
+
+        for plot in results.get("plots", []):
+            if plot.get("image_base64"):
+                logger.info(f"Adding plot: {plot.get('title', 'Untitled')}")
+                section_content_parts.append(f"""
+                    <div class='analysis-plot'>
+                        <h4>{plot.get('title', 'Analysis Plot')}</h4>
+                        <img src='data:image/png;base64,{plot["image_base64"]}'
+                             alt='{plot.get('title', "Plot")}'
+                             style='max-width:100%; height:auto; margin:10px 0;'/>
+                    </div>
+                """)
+
+        for table in results.get("tables", []):
+            if table.get("data_html"):
+                logger.info(f"Adding table to output for {template_name}")
+                section_content_parts.append(f"""
+                    <div class='analysis-table'>
+                        <h4>{table.get('title', 'Analysis Table')}</h4>
+                        <div style='overflow-x:auto;'>{table["data_html"]}</div>
+                    </div>
+                """)
+
+        return "".join(section_content_parts)
+
     def run_selected_analyses(
         selected_analyses: List[str],
         all_products_data: List[Dict[str, Any]],
         progress=gr.Progress()
-    ) -> Tuple[str, gr.update, Dict[str, str]]:
+    ) -> Iterator[Tuple[str, gr.update, Dict[str, str]]]:
+        """
+        Runs the selected templates concurrently and yields the partial detail map
+        each time one of them completes. Explanations are rendered in one batch
+        for the final update.
+        """
         if not selected_analyses:
-            return "Please select at least one analysis type.", gr.update(choices=[], value=None), {}
+            yield "Please select at least one analysis type.", gr.update(choices=[], value=None), {}
+            return
 
         if not all_products_data:
-            return "No product data available for analysis.", gr.update(choices=[], value=None), {}
+            yield "No product data available for analysis.", gr.update(choices=[], value=None), {}
+            return
+
+        templates = [ANALYSIS_TEMPLATES[key] for key in selected_analyses if key in ANALYSIS_TEMPLATES]
+        if not templates:
+            yield "No analysis results generated.", gr.update(choices=[], value=None), {}
+            return
 
-        logger.info(f"Running {len(selected_analyses)} selected analyses")
+        logger.info(f"Running {len(templates)} selected analyses")
         progress(0.1, "Preparing analyses...")
         detail_map: Dict[str, str] = {}
-        total = len(selected_analyses)
-
-        for idx, analysis_key in enumerate(selected_analyses):
-            template = ANALYSIS_TEMPLATES.get(analysis_key)
-            if not template:
-                continue
-
-            progress((idx + 1) / total, f"Running {template['name']}...")
-            logger.info(f"Processing analysis template: {template['name']}")
-
-            try:
-                results = execute_analysis_with_agent(template["prompt"], all_products_data)
-                logger.info(f"Got results for {template['name']}: {len(results.get('plots', []))} plots, {len(results.get('tables', []))} tables")
+        pending_explanations: Dict[str, str] = {}
+        total = len(templates)
+        completed = 0
+
+        with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_ANALYSES, total)) as executor:
+            futures = {
+                executor.submit(execute_analysis_with_agent, template["prompt"], all_products_data): template
+                for template in templates
+            }
+            for future in as_completed(futures):
+                template = futures[future]
+                completed += 1
+                progress(completed / total, f"Finished {template['name']} ({completed}/{total})")
+                logger.info(f"Processing analysis template: {template['name']}")
 
-                if results.get("error"):
-                    logger.error(f"Error in {template['name']}: {results['error']}")
-                    continue
+                try:
+                    results = future.result()
+                    logger.info(f"Got results for {template['name']}: {len(results.get('plots', []))} plots, {len(results.get('tables', []))} tables")
 
-                section_content_parts = []
+                    if results.get("error"):
+                        logger.error(f"Error in {template['name']}: {results['error']}")
+                        continue
 
-                for plot in results.get("plots", []):
-                    if plot.get("image_base64"):
-                        logger.info(f"Adding plot: {plot.get('title', 'Untitled')}")
-                        section_content_parts.append(f"""
-                            <div class='analysis-plot'>
-                                <h4>{plot.get('title', 'Analysis Plot')}</h4>
-                                <img src='data:image/png;base64,{plot["image_base64"]}'
-                                     alt='{plot.get('title', "Plot")}'
-                                     style='max-width:100%; height:auto; margin:10px 0;'/>
-                            </div>
-                        """)
-
-                for table in results.get("tables", []):
-                    if table.get("data_html"):
-                        logger.info("Adding table to output")
-                        section_content_parts.append(f"""
-                            <div class='analysis-table'>
-                                <h4>{table.get('title', 'Analysis Table')}</h4>
-                                <div style='overflow-x:auto;'>{table["data_html"]}</div>
-                            </div>
-                        """)
+                    if results.get("explanation"):
+                        logger.info("Adding explanation text")
+                        pending_explanations[template['name']] = results["explanation"]
 
-                explanation_html = ""
-                if results.get("explanation"):
-                    logger.info("Adding explanation text")
-                    explanation_html = format_markdown_content(results["explanation"])
-                    section_content_parts.append(explanation_html)
+                    is_first_result = not detail_map
+                    detail_map[template['name']] = _build_template_section(template['name'], results)
 
-                section_content = "".join(section_content_parts)
+                except Exception as e:
+                    logger.error(f"Error in analysis {template['name']}: {e}")
+                    continue
 
-                detail_map[template['name']] = section_content
+                dropdown_update = (
+                    _mk_dropdown_update(detail_map) if is_first_result
+                    else gr.update(choices=list(detail_map))
+                )
+                yield (
+                    f"Completed {completed} of {total} analyses...",
+                    dropdown_update,
+                    dict(detail_map)
+                )
 
-            except Exception as e:
-                logger.error(f"Error in analysis {template['name']}: {e}")
+        if pending_explanations:
+            names = list(pending_explanations)
+            rendered = batch_format_markdown([pending_explanations[name] for name in names])
+            for name, explanation_html in zip(names, rendered):
+                detail_map[name] += explanation_html
 
         if not detail_map:
-            return (
+            yield (
                 "No analysis results generated.",
                 gr.update(choices=[], value=None),
                 {}
             )
+            return
 
+        detail_map = {t['name']: detail_map[t['name']] for t in templates if t['name'] in detail_map}
         logger.info(f"Analysis complete with {len(detail_map)} output components")
-        return (
+        yield (
             "Analyses complete!",
-            _mk_dropdown_update(detail_map),
+            gr.update(choices=list(detail_map)),
             detail_map
         )
 
@@ -502,17 +582,19 @@ def create_analysis_tab(app_state: gr.State):
             all_data = load_all_product_comparison_data()
 
             if not (selected_analyses or (include_custom and custom_prompt.strip())):
-                return "Please select at least one analysis or provide a custom analysis.", gr.update(choices=[], value=None), {}
+                yield "Please select at least one analysis or provide a custom analysis.", gr.update(choices=[], value=None), {}
+                return
 
             if include_custom and custom_prompt.strip():
-                return run_selected_analyses_with_custom(selected_analyses, custom_prompt, all_data)
+                yield run_selected_analyses_with_custom(selected_analyses, custom_prompt, all_data)
             else:
-                return run_selected_analyses(selected_analyses, all_data)
+                yield from run_selected_analyses(selected_analyses, all_data)
 
         run_analysis_button.click(
             run_analyses_with_custom,
             inputs=checkbox_outputs + [custom_analysis_prompt, custom_analysis_active],
-            outputs=[analysis_status, detail_select, detail_state]
+            outputs=[analysis_status, detail_select, detail_state],
+            queue=True
         )
 
         def _show_detail(det_state: Dict[str, str], sel: str) -> str:
@@ -524,6 +606,14 @@ def create_analysis_tab(app_state: gr.State):
             outputs=[detail_area]
         )
 
+        # Streamed runs update the state without changing the selection; keep the
+        # visible section in sync as its explanation arrives.
+        detail_state.change(
+            _show_detail,
+            inputs=[detail_state, detail_select],
+            outputs=[detail_area]
+        )
+
         gr.Markdown("---")
         with gr.Row():
             export_excel_button = gr.Button("Export All Data to Excel", variant="secondary")
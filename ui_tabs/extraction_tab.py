@@ -1,6 +1,8 @@
 
+import asyncio
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, List, Optional, Tuple
 
 import gradio as gr
@@ -8,11 +10,30 @@ import pandas as pd
 
 from config import (AZURE_OPENAI_NONREASONING_MODEL_DEPLOYMENT,
                     AZURE_OPENAI_REASONING_MODEL_DEPLOYMENT,
-                    EXTRACTED_DATA_DIR, logger)
+                    EXTRACTED_DATA_DIR, EXTRACTION_MAX_CONCURRENCY, logger)
 from data_extractor import (apply_corrections, check_document_size,
-                            extract_answers_for_product, self_correct_answers)
-from local_storage import (load_extracted_data, load_product_config,
-                           load_questions_config, save_extracted_data)
+                            extract_answers_for_products_batched,
+                            get_markdown_signature, plan_extraction_batches,
+                            self_correct_answers)
+from local_storage import (dumps_json_bytes, list_extracted_product_names,
+                           load_extracted_data, load_product_config,
+                           load_questions_config, loads_json_bytes,
+                           save_extracted_data)
+from utils import clean_filename
+
+_EXTRACTED_STATES = frozenset({"Extracted", "Corrected"})
+_REVIEW_STATES = frozenset({"Extracted", "Corrected", "review_suggested"})
+HANDLER_CONCURRENCY_LIMIT = 8
+_DISPLAY_COLUMNS = ["Question ID", "Question Text", "Category", "Answer", "Status"]
+_EMPTY_DF = pd.DataFrame({c: pd.Series(dtype=object) for c in _DISPLAY_COLUMNS})
+_SAFE_TBL = str.maketrans({' ': '_', '/': '_'})
+_TEMP_DIR = os.path.join(EXTRACTED_DATA_DIR, "temp_corrections")
+os.makedirs(_TEMP_DIR, exist_ok=True)
+
+
+def _temp_corrections_path(product_name: str) -> str:
+    """Path of the temporary file holding AI-suggested corrections for a product."""
+    return os.path.join(_TEMP_DIR, f"{product_name.translate(_SAFE_TBL).lower()}_corrections_temp.json")
 
 
 def create_extraction_tab(app_state: gr.State) -> gr.Blocks:
@@ -27,7 +48,57 @@ def create_extraction_tab(app_state: gr.State) -> gr.Blocks:
         logger.info("extraction_tab: 'questions_config' loaded/initialized in app_state.")
 
 
-    def handle_extract_all_answers_action(
+    def _prefetch_product_configs(product_names: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Loads all product configs from disk in parallel, keyed by product name."""
+        if not product_names:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(16, len(product_names))) as executor:
+            configs = executor.map(lambda name: load_product_config(clean_filename(name)), product_names)
+            return dict(zip(product_names, configs))
+
+    async def _extract_products_concurrently(
+        product_names: List[str],
+        questions_cfg: Dict[str, Any],
+        model_choice: str,
+        progress: gr.Progress,
+        max_concurrency: int = EXTRACTION_MAX_CONCURRENCY
+    ) -> List[Tuple[str, bool, Optional[Dict[str, Any]]]]:
+        """
+        Runs extraction for several products at once, bounded by a semaphore. Products
+        whose documents fit a shared prompt are extracted together in one batch.
+        Returns (product_name, markdown_available, extracted_data) in input order.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        configs = await asyncio.to_thread(_prefetch_product_configs, product_names)
+        markdown_flags = [
+            bool(configs.get(name) and configs[name].get('markdown_document_infos')) for name in product_names
+        ]
+        results: Dict[str, Tuple[str, bool, Optional[Dict[str, Any]]]] = {
+            name: (name, False, None) for name, available in zip(product_names, markdown_flags) if not available
+        }
+        ready_names = [name for name, available in zip(product_names, markdown_flags) if available]
+        batches = await asyncio.to_thread(plan_extraction_batches, ready_names, product_configs=configs)
+        num_to_process = len(ready_names)
+        completed = 0
+
+        async def extract_batch(batch: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+            nonlocal completed
+            async with semaphore:
+                logger.info(f"Attempting extraction for products: {batch}")
+                batch_results = await asyncio.to_thread(
+                    extract_answers_for_products_batched, batch, questions_cfg, model_choice,
+                    product_configs=configs
+                )
+            completed += len(batch)
+            progress(completed / num_to_process, desc=f"Extracted {completed}/{num_to_process} ({', '.join(batch)})")
+            return batch_results
+
+        for batch_results in await asyncio.gather(*(extract_batch(batch) for batch in batches)):
+            for product_name, extracted_data in batch_results.items():
+                results[product_name] = (product_name, True, extracted_data)
+        return [results[name] for name in product_names]
+
+    async def handle_extract_all_answers_action(
         current_app_state_value: Dict[str, Any],
         model_choice: str,
         progress: gr.Progress = gr.Progress(track_tqdm=True)
@@ -45,90 +116,113 @@ def create_extraction_tab(app_state: gr.State) -> gr.Blocks:
         products_to_extract_names = [
             p['name'] for p in products_list if
             p.get('status') == "Processed to Markdown" and
-            p.get('extraction_status') not in ["Extracted", "Corrected"]
+            p.get('extraction_status') not in _EXTRACTED_STATES
         ]
 
         if not products_to_extract_names:
             extracted_names = [
-                p['name'] for p in products_list if p.get('extraction_status') in ["Extracted", "Corrected"]
+                p['name'] for p in products_list if p.get('extraction_status') in _EXTRACTED_STATES
             ]
             return current_app_state_value, "No products ready or requiring answer extraction.", extracted_names
 
         overall_status: List[str] = []
-        product_map_for_state_update = {p['name']: p.copy() for p in products_list}
+        product_map_for_state_update = {p['name']: p for p in products_list}
 
-        num_to_process = len(products_to_extract_names)
-        for i, product_name in enumerate(products_to_extract_names):
-            progress((i + 1) / num_to_process, desc=f"Extracting for {product_name}...")
-            logger.info(f"Attempting extraction for product: {product_name}")
+        progress(0, desc=f"Extracting answers for {len(products_to_extract_names)} products...")
+        extraction_results = await _extract_products_concurrently(
+            products_to_extract_names, questions_cfg, model_choice, progress
+        )
 
-            product_disk_config = load_product_config(product_name)
-            if not product_disk_config or not product_disk_config.get('markdown_document_infos'):
+        for product_name, markdown_available, extracted_data in extraction_results:
+            current_product_entry = dict(product_map_for_state_update[product_name])
+            product_map_for_state_update[product_name] = current_product_entry
+            if not markdown_available:
                 overall_status.append(f"Skipping {product_name}: Markdown data not found or incomplete on disk.")
                 logger.warning(f"Markdown data issue for {product_name}, skipping extraction.")
-                product_map_for_state_update[product_name]['extraction_status'] = "Markdown Missing"
+                current_product_entry['extraction_status'] = "Markdown Missing"
                 continue
 
-            extracted_data = extract_answers_for_product(product_name, questions_cfg, extract_by_category=True, model_choice=model_choice)
-
-            current_product_entry = product_map_for_state_update[product_name]
             if extracted_data and extracted_data.get("answers"):
-                save_extracted_data(product_name, extracted_data)
+                await asyncio.to_thread(save_extracted_data, product_name, extracted_data)
                 overall_status.append(f"Successfully extracted answers for {product_name}.")
                 current_product_entry['extraction_status'] = "Extracted"
             else:
                 overall_status.append(f"Failed to extract answers for {product_name}. Check logs.")
                 current_product_entry['extraction_status'] = "Extraction Failed"
 
-        current_app_state_value['products_list'] = list(product_map_for_state_update.values())
-        final_extracted_product_names = sorted(list(set(
+        current_app_state_value['products_list'] = [product_map_for_state_update[p['name']] for p in products_list]
+        final_extracted_product_names = sorted(
             p['name'] for p in current_app_state_value['products_list']
-            if p.get('extraction_status') in ["Extracted", "Corrected"]
-        )))
+            if p.get('extraction_status') in _EXTRACTED_STATES
+        )
         return current_app_state_value, "\n".join(overall_status) if overall_status else "Extraction complete.", final_extracted_product_names
 
 
+    def _build_df_from_answers(answers: List[Any]) -> pd.DataFrame:
+        """Formats a list of answer dicts into the display DataFrame."""
+        qids: List[Any] = []
+        qtexts: List[Any] = []
+        cats: List[Any] = []
+        answer_texts: List[Any] = []
+        statuses: List[Any] = []
+        for ans in answers:
+            if not isinstance(ans, dict):
+                continue
+            qids.append(ans.get("question_id"))
+            qtexts.append(ans.get("question_text"))
+            cats.append(ans.get("category"))
+            answer_texts.append(ans.get("answer"))
+            statuses.append(ans.get("status", "raw"))
+
+        df = pd.DataFrame({
+            "Question ID": qids,
+            "Question Text": qtexts,
+            "Category": cats,
+            "Answer": answer_texts,
+            "Status": statuses,
+        }, copy=False)
+        df = df.dropna(subset=["Question ID", "Question Text", "Category", "Answer"]).reset_index(drop=True)
+        df["Answer"] = df["Answer"].astype(str)
+        return df
+
     def get_display_data_for_product_df(product_name: Optional[str]) -> pd.DataFrame:
         """Formats extracted data for a product into a DataFrame."""
-        columns = ["Question ID", "Question Text", "Category", "Answer", "Status"]
         if not product_name:
-            return pd.DataFrame(columns=columns)
+            return _EMPTY_DF.copy()
 
         data = load_extracted_data(product_name)
         if data and "answers" in data and isinstance(data["answers"], list):
-            df_rows = [
-                {
-                    "Question ID": ans.get("question_id"),
-                    "Question Text": ans.get("question_text"),
-                    "Category": ans.get("category"),
-                    "Answer": str(ans.get("answer")),
-                    "Status": ans.get("status", "raw")
-                }
-                for ans in data["answers"]
-                if isinstance(ans, dict) and all(k in ans for k in ["question_id", "question_text", "category", "answer"])
-            ]
-            return pd.DataFrame(df_rows, columns=columns)
-        return pd.DataFrame(columns=columns)
+            return _build_df_from_answers(data["answers"])
+        return _EMPTY_DF.copy()
 
 
-    def handle_self_correction_action(
+    def _write_temp_corrections(path: str, corrections_list: List[Dict[str, Any]]) -> None:
+        with open(path, "wb") as f:
+            f.write(dumps_json_bytes(corrections_list))
+
+    def _read_temp_corrections(path: str) -> List[Dict[str, Any]]:
+        with open(path, "rb") as f:
+            return loads_json_bytes(f.read())
+
+    async def handle_self_correction_action(
         product_name: Optional[str], model_choice: str, progress: gr.Progress = gr.Progress(track_tqdm=True)
     ) -> Tuple[str, pd.DataFrame]:
         """Performs AI self-correction review for a product's extracted answers."""
-        df_columns = ["Question ID", "Question Text", "Category", "Answer", "Status"]
         if not product_name:
-            return "Please select a product for self-correction.", pd.DataFrame(columns=df_columns)
+            return "Please select a product for self-correction.", _EMPTY_DF.copy()
 
         progress(0.1, desc=f"Loading data for {product_name}...")
-        extracted_data_dict = load_extracted_data(product_name)
+        extracted_data_dict = await asyncio.to_thread(load_extracted_data, product_name)
         if not extracted_data_dict or "answers" not in extracted_data_dict:
-            return f"No extracted data found for {product_name}.", pd.DataFrame(columns=df_columns)
+            return f"No extracted data found for {product_name}.", _EMPTY_DF.copy()
 
         extracted_answers = extracted_data_dict["answers"]
         progress(0.3, desc=f"Requesting LLM review for {product_name}...")
-        corrections_list = self_correct_answers(product_name, extracted_answers, model_choice=model_choice)
+        corrections_list = await asyncio.to_thread(
+            self_correct_answers, product_name, extracted_answers, model_choice=model_choice
+        )
 
-        current_df = get_display_data_for_product_df(product_name)
+        current_df = await asyncio.to_thread(get_display_data_for_product_df, product_name)
 
         if corrections_list is None:
             return f"Self-correction review failed for {product_name}. Check logs.", current_df
@@ -136,60 +230,54 @@ def create_extraction_tab(app_state: gr.State) -> gr.Blocks:
         if not corrections_list:
             return f"No corrections suggested by AI for {product_name}. Answers appear consistent.", current_df
 
-        temp_corrections_dir = os.path.join(EXTRACTED_DATA_DIR, "temp_corrections")
-        os.makedirs(temp_corrections_dir, exist_ok=True)
-        safe_product_filename = product_name.replace(' ', '_').replace('/', '_').lower()
-        temp_corrections_path = os.path.join(temp_corrections_dir, f"{safe_product_filename}_corrections_temp.json")
+        temp_corrections_path = _temp_corrections_path(product_name)
         try:
-            with open(temp_corrections_path, "w", encoding="utf-8") as f:
-                json.dump(corrections_list, f, indent=4)
+            await asyncio.to_thread(_write_temp_corrections, temp_corrections_path, corrections_list)
         except IOError as e:
             logger.error(f"Failed to save temporary corrections for {product_name}: {e}")
             return f"Failed to save temporary corrections: {e}", current_df
 
         correction_q_ids = {c['question_id'] for c in corrections_list}
-        if not current_df.empty:
-            current_df['Status'] = current_df.apply(
-                lambda row: 'review_suggested' if row['Question ID'] in correction_q_ids and row['Status'] != 'corrected' else row['Status'],
-                axis=1
-            )
+        if correction_q_ids and not current_df.empty:
+            not_corrected = current_df['Status'].to_numpy() != 'corrected'
+            if not_corrected.any():
+                review_mask = current_df['Question ID'].isin(correction_q_ids).to_numpy() & not_corrected
+                current_df.loc[review_mask, 'Status'] = 'review_suggested'
 
         summary = f"AI suggested {len(corrections_list)} corrections for {product_name}. Review and apply if appropriate."
         return summary, current_df
 
 
-    def handle_apply_corrections_action_button(
+    async def handle_apply_corrections_action_button(
         product_name: Optional[str], progress: gr.Progress = gr.Progress(track_tqdm=True) # model_choice removed, not used by apply_corrections
     ) -> Tuple[str, pd.DataFrame]:
         """Applies previously suggested AI corrections."""
-        df_columns = ["Question ID", "Question Text", "Category", "Answer", "Status"]
         if not product_name:
-            return "Please select a product to apply corrections.", pd.DataFrame(columns=df_columns)
+            return "Please select a product to apply corrections.", _EMPTY_DF.copy()
 
         progress(0.1, desc=f"Loading data and corrections for {product_name}...")
-        original_data_dict = load_extracted_data(product_name)
+        original_data_dict = await asyncio.to_thread(load_extracted_data, product_name)
         if not original_data_dict or "answers" not in original_data_dict:
-            return f"Original extracted data not found for {product_name}.", pd.DataFrame(columns=df_columns)
+            return f"Original extracted data not found for {product_name}.", _EMPTY_DF.copy()
 
-        temp_corrections_dir = os.path.join(EXTRACTED_DATA_DIR, "temp_corrections")
-        safe_product_filename = product_name.replace(' ', '_').replace('/', '_').lower()
-        temp_corrections_path = os.path.join(temp_corrections_dir, f"{safe_product_filename}_corrections_temp.json")
+        temp_corrections_path = _temp_corrections_path(product_name)
 
         if not os.path.exists(temp_corrections_path):
-            return "No corrections found to apply. Run self-correction review first.", get_display_data_for_product_df(product_name)
+            return "No corrections found to apply. Run self-correction review first.", await asyncio.to_thread(get_display_data_for_product_df, product_name)
 
         try:
-            with open(temp_corrections_path, "r", encoding="utf-8") as f:
-                corrections_list = json.load(f)
+            corrections_list = await asyncio.to_thread(_read_temp_corrections, temp_corrections_path)
         except (IOError, json.JSONDecodeError) as e:
             logger.error(f"Failed to load temporary corrections for {product_name}: {e}")
-            return f"Failed to load temporary corrections: {e}", get_display_data_for_product_df(product_name)
+            return f"Failed to load temporary corrections: {e}", await asyncio.to_thread(get_display_data_for_product_df, product_name)
 
         progress(0.5, desc=f"Applying corrections for {product_name}...")
-        corrected_answers = apply_corrections(original_data_dict["answers"], corrections_list, product_name)
+        answers_by_id = {ans['question_id']: ans for ans in original_data_dict["answers"]}
+        answers_by_id = await asyncio.to_thread(apply_corrections, answers_by_id, corrections_list, product_name)
+        corrected_answers = list(answers_by_id.values())
 
         original_data_dict["answers"] = corrected_answers
-        save_extracted_data(product_name, original_data_dict)
+        await asyncio.to_thread(save_extracted_data, product_name, original_data_dict)
 
         logger.info(f"Product {product_name} extraction_status should be updated to 'Corrected'.")
 
@@ -200,7 +288,7 @@ def create_extraction_tab(app_state: gr.State) -> gr.Blocks:
             logger.warning(f"Could not remove temporary corrections file {temp_corrections_path}: {e}")
 
         progress(1.0, desc="Corrections applied.")
-        return f"Corrections applied and saved for {product_name}.", get_display_data_for_product_df(product_name)
+        return f"Corrections applied and saved for {product_name}.", _build_df_from_answers(corrected_answers)
 
 
     def check_products_truncation_status(current_app_state_value: Dict[str, Any]) -> str:
@@ -209,12 +297,22 @@ def create_extraction_tab(app_state: gr.State) -> gr.Blocks:
         if not products_list:
             return "No products available to check for truncation."
 
+        # {product_name: (markdown_signature, size_chars, needs_truncation)}
+        truncation_cache: Dict[str, Tuple[Any, int, bool]] = current_app_state_value.setdefault('truncation_cache', {})
+
         status_lines = ["### Document Size Status for Extraction"]
         found_processed = False
         for p_entry in products_list:
             if p_entry.get('status') == "Processed to Markdown":
                 found_processed = True
-                needs_truncation, size_chars = check_document_size(p_entry['name'])
+                product_name = p_entry['name']
+                signature = get_markdown_signature(product_name)
+                cached = truncation_cache.get(product_name)
+                if signature is not None and cached and cached[0] == signature:
+                    _, size_chars, needs_truncation = cached
+                else:
+                    needs_truncation, size_chars = check_document_size(product_name)
+                    truncation_cache[product_name] = (signature, size_chars, needs_truncation)
                 size_kb = size_chars / 1024
                 status_icon = "🔴 Will be truncated" if needs_truncation else "🟢 Fits context"
                 status_lines.append(f"- **{p_entry['name']}**: {status_icon} (Size: {size_kb:.1f} KB)")
@@ -242,24 +340,13 @@ def create_extraction_tab(app_state: gr.State) -> gr.Blocks:
             """Populates dropdown with products that have extracted data."""
             products_list: List[Dict[str, Any]] = current_app_state_value.get('products_list', [])
 
-            extracted_product_names = sorted(list(set(
+            extracted_product_names = sorted(
                 p['name'] for p in products_list
-                if p.get('extraction_status') in ["Extracted", "Corrected", "review_suggested"]
-            )))
-
-            if not extracted_product_names and os.path.exists(EXTRACTED_DATA_DIR):
-                disk_extracted_names = []
-                for f_name in os.listdir(EXTRACTED_DATA_DIR):
-                    if f_name.endswith("_extracted.json"):
-                        product_name_from_file = f_name.replace("_extracted.json", "").replace("_", " ").title()
-                        data = load_extracted_data(product_name_from_file)
-                        if data and data.get("product_name_original"):
-                             disk_extracted_names.append(data["product_name_original"])
-                        elif data:
-                             disk_extracted_names.append(product_name_from_file)
-
+                if p.get('extraction_status') in _REVIEW_STATES
+            )
 
-                extracted_product_names = sorted(list(set(disk_extracted_names)))
+            if not extracted_product_names:
+                extracted_product_names = sorted(set(list_extracted_product_names()))
 
             return gr.Dropdown(
                 choices=extracted_product_names,
@@ -283,7 +370,8 @@ def create_extraction_tab(app_state: gr.State) -> gr.Blocks:
         extract_all_button_ui.click(
             handle_extract_all_answers_action,
             inputs=[app_state, model_choice_ui],
-            outputs=[app_state, extraction_status_ui, product_select_for_review_ui]
+            outputs=[app_state, extraction_status_ui, product_select_for_review_ui],
+            concurrency_limit=HANDLER_CONCURRENCY_LIMIT
         ).then(
             check_products_truncation_status,
             inputs=[app_state],
@@ -299,13 +387,15 @@ def create_extraction_tab(app_state: gr.State) -> gr.Blocks:
         self_correct_button_ui.click(
             handle_self_correction_action,
             inputs=[product_select_for_review_ui, model_choice_ui],
-            outputs=[correction_status_ui, extracted_answers_df_ui]
+            outputs=[correction_status_ui, extracted_answers_df_ui],
+            concurrency_limit=HANDLER_CONCURRENCY_LIMIT
         )
 
         apply_corrections_button_ui.click(
             handle_apply_corrections_action_button,
             inputs=[product_select_for_review_ui],
-            outputs=[correction_status_ui, extracted_answers_df_ui]
+            outputs=[correction_status_ui, extracted_answers_df_ui],
+            concurrency_limit=HANDLER_CONCURRENCY_LIMIT
         )
 
         extraction_tab_ui.load(
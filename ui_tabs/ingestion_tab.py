@@ -1,6 +1,10 @@
 
-import json
+import asyncio
+import functools
 import os
+import shutil
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from typing import Any, Dict, List, Optional, Tuple
 
 import gradio as gr
@@ -9,13 +13,94 @@ import pandas as pd
 from config import DEFAULT_PRODUCTS, logger
 from document_processor import pdf_to_markdown_pages_for_doc
 from local_storage import (get_product_data_dir, list_saved_products,
-                           load_markdown_page, load_product_config,
-                           save_markdown_page, save_product_config)
+                           load_product_config,
+                           save_markdown_page, save_product_config,
+                           write_json_atomic)
 from ui_components.pdf_previewer import (create_pdf_preview_html,
                                          create_side_by_side_view)
-from utils import get_document_name_from_url, download_pdf
+from utils import (clean_filename, download_pdfs_async,
+                   get_document_name_from_url, get_pdf_download_path,
+                   load_markdown_page_cached)
 
 MAX_PDFS_PER_PRODUCT = 2
+PROCESSING_MAX_WORKERS = 8
+_prefetch_executor: Optional[ThreadPoolExecutor] = None
+
+
+@functools.lru_cache(maxsize=64)
+def _cached_pdf_preview(pdf_abs_path: str, mtime_ns: int, page_index: int) -> str:
+    return create_pdf_preview_html(pdf_abs_path, page_index)
+
+
+def _pdf_preview(pdf_abs_path: str, page_index: int) -> str:
+    """Renders a PDF page preview, served from memory while the PDF is unchanged on disk."""
+    try:
+        mtime_ns = os.stat(pdf_abs_path).st_mtime_ns
+    except OSError:
+        return create_pdf_preview_html(pdf_abs_path, page_index)
+    return _cached_pdf_preview(pdf_abs_path, mtime_ns, page_index)
+
+
+def _get_prefetch_executor() -> ThreadPoolExecutor:
+    global _prefetch_executor
+    if _prefetch_executor is None:
+        _prefetch_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="page-prefetch")
+    return _prefetch_executor
+
+
+def _prefetch_adjacent_pages(page_paths: List[str], page_index: int) -> None:
+    """
+    Warms the markdown page cache for the neighbours of page_index in the background.
+    PDF previews are not prefetched: PyMuPDF is not thread-safe, so rendering stays on the handler thread.
+    """
+    executor = _get_prefetch_executor()
+    for neighbour_index in (page_index + 1, page_index - 1):
+        if 0 <= neighbour_index < len(page_paths):
+            executor.submit(load_markdown_page_cached, page_paths[neighbour_index])
+
+
+def _batch_read_pages(page_paths: List[str]) -> None:
+    """Warms the page cache with every markdown page of a document in one background task."""
+    def read_all() -> None:
+        for page_path in page_paths:
+            load_markdown_page_cached(page_path)
+
+    if page_paths:
+        _get_prefetch_executor().submit(read_all)
+
+
+def _run_download_batch(jobs: List[Tuple[str, str, str]], result_futures: List[Future]) -> None:
+    """Runs download_pdfs_async for jobs, resolving result_futures[i] with job i's local path."""
+    try:
+        asyncio.run(download_pdfs_async(jobs, lambda index, path: result_futures[index].set_result(path)))
+    except Exception as e:
+        logger.error(f"Unexpected error in batch PDF download: {e}")
+    finally:
+        for future in result_futures:
+            if not future.done():
+                future.set_result(None)
+
+
+def _copy_downloaded_pdf(source_future: Future, product_name: str, doc_name: str) -> Optional[str]:
+    """Waits for another job's download of the same URL and copies the PDF into this product's directory."""
+    source_path = source_future.result()
+    if not source_path:
+        return None
+
+    target_path = get_pdf_download_path(product_name, doc_name)
+    if os.path.abspath(target_path) != os.path.abspath(source_path):
+        try:
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            shutil.copyfile(source_path, target_path)
+        except OSError as e:
+            logger.error(f"Error copying downloaded PDF {source_path} to {target_path}: {e}")
+            return None
+    return target_path
+
+
+def _index_products_by_name(products_list: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Returns a name -> product entry index over products_list."""
+    return {p['name']: p for p in products_list}
 
 
 def create_ingestion_tab(app_state: gr.State) -> gr.Blocks:
@@ -45,10 +130,10 @@ def create_ingestion_tab(app_state: gr.State) -> gr.Blocks:
             return current_app_state_value, "Product name cannot be empty."
 
         products_list: List[Dict[str, Any]] = current_app_state_value.get('products_list', [])
-        if any(p['name'] == product_name for p in products_list):
+        if any(p.get('name') == product_name for p in products_list):
             return current_app_state_value, f"Product '{product_name}' already exists in the list."
 
-        pdf_urls = [url.strip() for url in pdf_urls_str.split(',') if url.strip()]
+        pdf_urls = [stripped for url in pdf_urls_str.split(',') if (stripped := url.strip())]
         if not pdf_urls:
             return current_app_state_value, "Please provide at least one PDF URL."
         if len(pdf_urls) > MAX_PDFS_PER_PRODUCT:
@@ -68,13 +153,12 @@ def create_ingestion_tab(app_state: gr.State) -> gr.Blocks:
         os.makedirs(product_dir, exist_ok=True)
         temp_config_path = os.path.join(product_dir, "_config.json")
         try:
-            with open(temp_config_path, "w", encoding="utf-8") as f:
-                json.dump({
-                    "product_name": product_name,
-                    "pdf_urls": pdf_urls,
-                    "status": "Pending",
-                    "markdown_document_infos": []
-                }, f, indent=4)
+            write_json_atomic(temp_config_path, {
+                "product_name": product_name,
+                "pdf_urls": pdf_urls,
+                "status": "Pending",
+                "markdown_document_infos": []
+            })
         except IOError as e:
             logger.error(f"Error saving initial product config for {product_name}: {e}")
 
@@ -90,7 +174,14 @@ def create_ingestion_tab(app_state: gr.State) -> gr.Blocks:
             return current_app_state_value, "No products in the list to process."
 
         overall_status_messages: List[str] = []
-        product_map_for_update = {p['name']: p.copy() for p in products_list}
+        products_by_name = _index_products_by_name(products_list)
+        product_map_for_update: Dict[str, Dict[str, Any]] = {}
+
+        def _get_mut(name: str) -> Dict[str, Any]:
+            """Returns a private copy of a product entry, copying it on first mutation only."""
+            if name not in product_map_for_update:
+                product_map_for_update[name] = products_by_name[name].copy()
+            return product_map_for_update[name]
 
         products_to_process = [
             p for p in products_list
@@ -100,40 +191,107 @@ def create_ingestion_tab(app_state: gr.State) -> gr.Blocks:
         if not products_to_process:
             return current_app_state_value, "No products requiring processing."
 
-        num_products = len(products_to_process)
-        for i, product_entry in enumerate(products_to_process):
+        download_jobs: List[Tuple[str, int, str, str]] = []
+        for product_entry in products_to_process:
+            logger.info(f"Processing product: {product_entry['name']}")
+            for doc_idx, url in enumerate(product_entry['pdf_urls']):
+                doc_name = get_document_name_from_url(url)
+                if not doc_name or doc_name == ".pdf":
+                    doc_name = f"document_{doc_idx + 1}.pdf"
+                download_jobs.append((product_entry['name'], doc_idx, url, doc_name))
+
+        # Downloads feed conversions as a pipeline: once all of a product's PDFs are on
+        # disk its DI conversions start, while other products are still downloading.
+        pending_downloads: Dict[str, int] = defaultdict(int)
+        for product_name, _, _, _ in download_jobs:
+            pending_downloads[product_name] += 1
+
+        total_steps = 2 * len(download_jobs)
+        completed_steps = 0
+        pdf_paths_by_product: Dict[str, Dict[int, Optional[str]]] = defaultdict(dict)
+        page_paths_by_job: Dict[Tuple[str, int], Optional[List[str]]] = {}
+        with ThreadPoolExecutor(max_workers=PROCESSING_MAX_WORKERS) as download_executor, \
+                ThreadPoolExecutor(max_workers=PROCESSING_MAX_WORKERS) as conversion_executor:
+            # Identical URLs are downloaded once; later jobs copy the finished file.
+            # Unique URLs go to the async downloader as one batch, which resolves
+            # their futures as each download completes.
+            in_flight: Dict[str, Future] = {}
+            futures: Dict[Future, Tuple[str, str, int]] = {}
+            unique_jobs: List[Tuple[str, str, str]] = []
+            duplicate_jobs: List[Tuple[str, int, str, str]] = []
+            for product_name, doc_idx, url, doc_name in download_jobs:
+                if url in in_flight:
+                    duplicate_jobs.append((product_name, doc_idx, url, doc_name))
+                    continue
+                future = in_flight[url] = Future()
+                futures[future] = ("download", product_name, doc_idx)
+                unique_jobs.append((url, product_name, doc_name))
+            download_executor.submit(_run_download_batch, unique_jobs, list(in_flight.values()))
+            for product_name, doc_idx, url, doc_name in duplicate_jobs:
+                future = download_executor.submit(_copy_downloaded_pdf, in_flight[url], product_name, doc_name)
+                futures[future] = ("download", product_name, doc_idx)
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, product_name, doc_idx = futures.pop(future)
+                    completed_steps += 1
+                    if stage == "download":
+                        try:
+                            pdf_paths_by_product[product_name][doc_idx] = future.result()
+                        except Exception as e:
+                            logger.error(f"Unexpected error downloading PDF for {product_name}: {e}")
+                            pdf_paths_by_product[product_name][doc_idx] = None
+                        pending_downloads[product_name] -= 1
+                        if pending_downloads[product_name] == 0 and all(pdf_paths_by_product[product_name].values()):
+                            for job_product, job_doc_idx, _, job_doc_name in download_jobs:
+                                if job_product == product_name:
+                                    conversion_future = conversion_executor.submit(
+                                        pdf_to_markdown_pages_for_doc,
+                                        pdf_paths_by_product[product_name][job_doc_idx], product_name, job_doc_name
+                                    )
+                                    futures[conversion_future] = ("convert", product_name, job_doc_idx)
+                        progress(completed_steps / total_steps, desc=f"Downloaded PDF for {product_name}...")
+                    else:
+                        try:
+                            page_paths_by_job[(product_name, doc_idx)] = future.result()[0]
+                        except Exception as e:
+                            logger.error(f"Unexpected error converting PDF to Markdown for {product_name}: {e}")
+                            page_paths_by_job[(product_name, doc_idx)] = None
+                        progress(completed_steps / total_steps, desc=f"Converted PDF for {product_name}...")
+
+        failed_products = set()
+        for product_name, doc_idx, url, _ in download_jobs:
+            if product_name not in failed_products and not pdf_paths_by_product[product_name].get(doc_idx):
+                overall_status_messages.append(f"Error downloading PDF for {product_name} from {url}.")
+                _get_mut(product_name)['status'] = "Error downloading PDF"
+                failed_products.add(product_name)
+
+        conversion_jobs = [job for job in download_jobs if job[0] not in failed_products]
+
+        for product_entry in products_to_process:
             product_name = product_entry['name']
+            if product_name in failed_products:
+                continue
             pdf_urls = product_entry['pdf_urls']
-            progress((i + 1) / num_products, desc=f"Processing {product_name}...")
-            logger.info(f"Processing product: {product_name}")
 
             product_succeeded = True
-            all_original_pdf_paths: List[Optional[str]] = []
+            all_original_pdf_paths: Dict[str, Optional[str]] = {}
             all_markdown_document_infos: List[Dict[str, Any]] = []
+            product_data_dir = get_product_data_dir(product_name)
 
-            for doc_idx, url in enumerate(pdf_urls):
-                doc_name = get_document_name_from_url(url)
-                if not doc_name or doc_name == ".pdf":
-                    doc_name = f"document_{doc_idx + 1}.pdf"
+            for _, doc_idx, _, doc_name in (job for job in conversion_jobs if job[0] == product_name):
+                pdf_path = pdf_paths_by_product[product_name][doc_idx]
+                all_original_pdf_paths[doc_name] = pdf_path
 
-                pdf_path = download_pdf(url, product_name, doc_name)
-                if not pdf_path:
-                    overall_status_messages.append(f"Error downloading PDF for {product_name} from {url}.")
-                    product_map_for_update[product_name]['status'] = "Error downloading PDF"
-                    product_succeeded = False
-                    break
-                all_original_pdf_paths.append(pdf_path)
-
-                page_paths, _ = pdf_to_markdown_pages_for_doc(pdf_path, product_name, doc_name)
+                page_paths = page_paths_by_job.get((product_name, doc_idx))
                 if page_paths is None:
                     overall_status_messages.append(f"Critical error converting PDF to Markdown for {product_name} - {doc_name}.")
-                    product_map_for_update[product_name]['status'] = f"Error in DI for {doc_name}"
+                    _get_mut(product_name)['status'] = f"Error in DI for {doc_name}"
                     product_succeeded = False
                     break
                 if not page_paths:
                      overall_status_messages.append(f"DI returned no content for {product_name} - {doc_name}.")
 
-                product_data_dir = get_product_data_dir(product_name)
                 relative_page_paths = [os.path.relpath(p, product_data_dir) for p in page_paths]
 
                 all_markdown_document_infos.append({
@@ -147,14 +305,14 @@ def create_ingestion_tab(app_state: gr.State) -> gr.Blocks:
 
             if all_markdown_document_infos:
                 save_product_config(product_name, pdf_urls, all_original_pdf_paths, all_markdown_document_infos)
-                product_map_for_update[product_name]['status'] = "Processed to Markdown"
-                product_map_for_update[product_name]['markdown_docs'] = all_markdown_document_infos
+                _get_mut(product_name)['status'] = "Processed to Markdown"
+                _get_mut(product_name)['markdown_docs'] = all_markdown_document_infos
                 overall_status_messages.append(f"Successfully processed {product_name} to Markdown.")
             else:
-                product_map_for_update[product_name]['status'] = "DI returned no content or error"
+                _get_mut(product_name)['status'] = "DI returned no content or error"
                 overall_status_messages.append(f"DI processing yielded no content for {product_name}.")
 
-        current_app_state_value['products_list'] = list(product_map_for_update.values())
+        current_app_state_value['products_list'] = [product_map_for_update.get(p['name'], p) for p in products_list]
         final_status = "\n".join(overall_status_messages) if overall_status_messages else "Processing complete. No issues."
         return current_app_state_value, final_status
 
@@ -162,19 +320,18 @@ def create_ingestion_tab(app_state: gr.State) -> gr.Blocks:
     def get_product_names_for_review_dropdown(current_app_state_value: Dict[str, Any]) -> gr.Dropdown:
         """Populates dropdown with products that have been processed to Markdown."""
         products_list: List[Dict[str, Any]] = current_app_state_value.get('products_list', [])
-        processed_product_names = sorted(list(set(
+        processed_names = {
             p['name'] for p in products_list
             if p.get('status') == "Processed to Markdown" and p.get('markdown_docs')
-        )))
+        }
 
-        saved_product_dirs = list_saved_products()
-        for product_dir_name in saved_product_dirs:
+        processed_product_dirs = {clean_filename(name) for name in processed_names}
+        for product_dir_name in set(list_saved_products()) - processed_product_dirs:
             config = load_product_config(product_dir_name)
             if config and config.get("product_name") and config.get("markdown_document_infos"):
-                if config["product_name"] not in processed_product_names:
-                    processed_product_names.append(config["product_name"])
+                processed_names.add(config["product_name"])
 
-        processed_product_names = sorted(list(set(processed_product_names)))
+        processed_product_names = sorted(processed_names)
 
         return gr.Dropdown(
             choices=processed_product_names,
@@ -190,10 +347,9 @@ def create_ingestion_tab(app_state: gr.State) -> gr.Blocks:
         if not selected_product_name:
             return gr.Dropdown(choices=[], label="Select Document", interactive=False, value=None)
 
-        products_list: List[Dict[str, Any]] = current_app_state_value.get('products_list', [])
         doc_names: List[str] = []
 
-        product_entry = next((p for p in products_list if p['name'] == selected_product_name), None)
+        product_entry = next((p for p in current_app_state_value.get('products_list', []) if p['name'] == selected_product_name), None)
 
         if product_entry and product_entry.get('markdown_docs'):
             doc_names = [md_doc['doc_name'] for md_doc in product_entry.get('markdown_docs', []) if md_doc.get('doc_name')]
@@ -203,7 +359,7 @@ def create_ingestion_tab(app_state: gr.State) -> gr.Blocks:
                  doc_names = [md_doc['doc_name'] for md_doc in config.get('markdown_document_infos', []) if md_doc.get('doc_name')]
 
         return gr.Dropdown(
-            choices=sorted(list(set(doc_names))),
+            choices=sorted(set(doc_names)),
             label="Select Document",
             interactive=True,
             value=doc_names[0] if doc_names else None
@@ -245,7 +401,7 @@ def create_ingestion_tab(app_state: gr.State) -> gr.Blocks:
         if not page_abs_paths:
             return ("No valid markdown page paths found.", 0, 0, [], "No pages.", "", "")
 
-        first_page_content = load_markdown_page(page_abs_paths[0])
+        first_page_content = load_markdown_page_cached(page_abs_paths[0])
         if first_page_content is None:
             return (f"Error loading first page from {page_abs_paths[0]}.", 0, 0, page_abs_paths, "Load error.", "", "")
 
@@ -259,22 +415,28 @@ def create_ingestion_tab(app_state: gr.State) -> gr.Blocks:
 
         if not pdf_abs_path:
             disk_config = load_product_config(product_name)
-            if disk_config and disk_config.get('original_pdf_paths'):
+            original_pdf_paths = disk_config.get('original_pdf_paths') if disk_config else None
+            if isinstance(original_pdf_paths, dict):
+                pdf_abs_path = original_pdf_paths.get(doc_name) or ""
+            elif original_pdf_paths:
+                # Configs saved before PDFs were keyed by doc name hold a plain list.
                 doc_name_base = os.path.splitext(doc_name)[0]
-                for p in disk_config['original_pdf_paths']:
+                for p in original_pdf_paths:
                     if p and os.path.exists(p) and doc_name_base in os.path.basename(p):
                         pdf_abs_path = p
                         break
 
         side_by_side_html = ""
         if pdf_abs_path and os.path.exists(pdf_abs_path):
-            pdf_preview_html_content = create_pdf_preview_html(pdf_abs_path, 0)
+            pdf_preview_html_content = _pdf_preview(pdf_abs_path, 0)
             side_by_side_html = create_side_by_side_view(first_page_content, pdf_preview_html_content)
         else:
             logger.warning(f"No valid PDF found for preview for {product_name}/{doc_name}")
             side_by_side_html = create_side_by_side_view(first_page_content, "<p>PDF preview not available.</p>")
 
 
+        _prefetch_adjacent_pages(page_abs_paths, 0)
+        _batch_read_pages(page_abs_paths[2:])
         status_text = f"Displaying Page 1 of {len(page_abs_paths)} for {doc_name} ({product_name})"
         return first_page_content, 0, len(page_abs_paths), page_abs_paths, status_text, pdf_abs_path, side_by_side_html
 
@@ -301,7 +463,7 @@ def create_ingestion_tab(app_state: gr.State) -> gr.Blocks:
         logger.debug(f"Navigating page: current={current_page_index}, new={new_page_index}, total={total_pages}")
         logger.debug(f"Using page path: {page_paths_state[new_page_index]}")
 
-        page_content = load_markdown_page(page_paths_state[new_page_index])
+        page_content = load_markdown_page_cached(page_paths_state[new_page_index])
         if page_content is None:
             error_msg = f"Error loading page content from {page_paths_state[new_page_index]}"
             logger.error(error_msg)
@@ -309,11 +471,12 @@ def create_ingestion_tab(app_state: gr.State) -> gr.Blocks:
 
         side_by_side_html = ""
         if pdf_abs_path and os.path.exists(pdf_abs_path):
-            pdf_preview_html_content = create_pdf_preview_html(pdf_abs_path, new_page_index)
+            pdf_preview_html_content = _pdf_preview(pdf_abs_path, new_page_index)
             side_by_side_html = create_side_by_side_view(page_content, pdf_preview_html_content)
         else:
             side_by_side_html = create_side_by_side_view(page_content, "<p>PDF preview not available.</p>")
 
+        _prefetch_adjacent_pages(page_paths_state, new_page_index)
         context = f" for {doc_name} ({product_name})" if product_name and doc_name else ""
         status_text = f"Displaying Page {new_page_index + 1} of {total_pages}{context}"
         return page_content, new_page_index, status_text, side_by_side_html
@@ -395,14 +558,11 @@ def create_ingestion_tab(app_state: gr.State) -> gr.Blocks:
         ) -> pd.DataFrame:
             """Helper to format products_list from app_state for DataFrame display."""
             products_list: List[Dict[str, Any]] = current_app_state_value.get('products_list', [])
-            display_data = [
-                [
-                    p.get('name', 'N/A'),
-                    ", ".join(p.get('pdf_urls', [])),
-                    p.get('status', 'Unknown')
-                ] for p in products_list
-            ]
-            return pd.DataFrame(display_data, columns=["Name", "PDF URLs", "Status"])
+            return pd.DataFrame({
+                "Name": [p.get('name', 'N/A') for p in products_list],
+                "PDF URLs": [", ".join(p.get('pdf_urls', ())) for p in products_list],
+                "Status": [p.get('status', 'Unknown') for p in products_list],
+            }, dtype=object, copy=False)
 
         add_product_button_ui.click(
             add_product_to_list_and_state,
@@ -498,14 +658,19 @@ def create_ingestion_tab(app_state: gr.State) -> gr.Blocks:
             outputs=[save_markdown_status_ui]
         )
 
+        def load_products_from_app_state(current_app_state_val: Dict[str, Any]) -> Tuple[Dict[str, Any], pd.DataFrame]:
+            """Fast first paint: initializes defaults and renders the table from in-memory state only."""
+            current_app_state_val = initialize_app_state_with_defaults(current_app_state_val)
+            return current_app_state_val, update_products_df_display_from_app_state(current_app_state_val)
+
         ingestion_tab_ui.load(
-            lambda current_app_state_val: (
-                update_products_df_display_from_app_state(
-                    initialize_app_state_with_defaults(current_app_state_val)
-                ),
-                get_product_names_for_review_dropdown(current_app_state_val)
-            ),
+            load_products_from_app_state,
+            inputs=[app_state],
+            outputs=[app_state, products_df_ui]
+        ).then(
+            get_product_names_for_review_dropdown,
             inputs=[app_state],
-            outputs=[products_df_ui, review_product_dropdown_ui]
+            outputs=[review_product_dropdown_ui],
+            show_progress=False
         )
     return ingestion_tab_ui
\ No newline at end of file
@@ -1,6 +1,10 @@
 
+import atexit
+import bisect
 import os
+import threading
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, List, Tuple
 
 import gradio as gr
@@ -10,9 +14,17 @@ from config import (AZURE_OPENAI_NONREASONING_MODEL_DEPLOYMENT,
                     AZURE_OPENAI_REASONING_MODEL_DEPLOYMENT,
                     get_default_categories, get_default_questions, logger)
 from local_storage import (get_product_data_dir, list_saved_products,
-                           load_markdown_page, load_product_config,
+                           load_product_config,
                            load_questions_config, save_questions_config)
-from question_manager import suggest_categories_and_questions
+from question_manager import (MAX_PROMPT_TOKEN_APPROXIMATION,
+                              get_prompt_char_budget,
+                              suggest_categories_and_questions)
+from utils import cache_stats, load_markdown_page_cached
+
+MARKDOWN_READ_MAX_WORKERS = 32
+QUESTIONS_SAVE_DEBOUNCE_SECONDS = 0.15
+QUESTIONS_DF_COLUMNS = ["Select", "ID", "Question Text", "Applies to Categories"]
+QUESTIONS_DF_DTYPES = {"Select": "bool", "ID": "string", "Question Text": "string", "Applies to Categories": "string"}
 
 
 def create_questions_tab(app_state: gr.State) -> gr.Blocks:
@@ -26,14 +38,42 @@ def create_questions_tab(app_state: gr.State) -> gr.Blocks:
             logger.info("Initialized empty questions_config in app_state from load_questions_config.")
 
 
+    pending_save: Dict[str, Any] = {"config": None, "timer": None}
+    pending_save_lock = threading.Lock()
+    questions_config_write_lock = threading.Lock()
+
+    def flush_pending_questions_config_save() -> None:
+        """Writes the most recently scheduled questions config, if any; flushes never overlap."""
+        with questions_config_write_lock:
+            with pending_save_lock:
+                config_to_save = pending_save["config"]
+                pending_save["config"] = None
+                pending_save["timer"] = None
+            if config_to_save is not None:
+                save_questions_config(config_to_save)
+
+    atexit.register(flush_pending_questions_config_save)
+
+    def schedule_questions_config_save(config_data: Dict[str, Any]) -> None:
+        """Coalesces saves made within QUESTIONS_SAVE_DEBOUNCE_SECONDS into a single disk write."""
+        with pending_save_lock:
+            pending_save["config"] = config_data
+            if pending_save["timer"] is None:
+                timer = threading.Timer(QUESTIONS_SAVE_DEBOUNCE_SECONDS, flush_pending_questions_config_save)
+                timer.daemon = True
+                pending_save["timer"] = timer
+                timer.start()
+
     def update_and_save_app_state_questions_config(current_app_state_value: Dict[str, Any], new_config_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Updates questions_config in app_state and saves it to disk."""
+        """Updates questions_config in app_state and schedules a (debounced) save to disk."""
         current_app_state_value['questions_config'] = new_config_data
-        save_questions_config(new_config_data)
+        schedule_questions_config_save(new_config_data)
         return current_app_state_value
 
-    def get_all_markdown_content_for_suggestion(current_app_state_value: Dict[str, Any]) -> Dict[str, List[str]]:
-        """Aggregates markdown content from all processed products for question suggestion."""
+    def get_all_markdown_content_for_suggestion(
+        current_app_state_value: Dict[str, Any], max_chars_per_product: int = MAX_PROMPT_TOKEN_APPROXIMATION
+    ) -> Dict[str, List[str]]:
+        """Aggregates markdown content from all processed products for question suggestion, capped per product."""
         all_md_content_map: Dict[str, List[str]] = {}
         products_list: List[Dict[str, Any]] = current_app_state_value.get('products_list', [])
 
@@ -42,68 +82,109 @@ def create_questions_tab(app_state: gr.State) -> gr.Blocks:
             if prod_entry.get('name') and prod_entry.get('status') == "Processed to Markdown" and prod_entry.get('markdown_docs'):
                 product_names_to_process.add(prod_entry['name'])
 
+        configs_by_product: Dict[str, Dict[str, Any]] = {}
         saved_product_dirs = list_saved_products()
         for product_dir_name in saved_product_dirs:
             config = load_product_config(product_dir_name)
-            if config and config.get("product_name") and config.get("markdown_document_infos"):
-                product_names_to_process.add(config["product_name"])
+            if config and config.get("product_name"):
+                configs_by_product[config["product_name"]] = config
+                if config.get("markdown_document_infos"):
+                    product_names_to_process.add(config["product_name"])
 
         logger.info(f"Products considered for markdown aggregation: {product_names_to_process}")
 
+        def load_product_pages(name: str, page_paths: List[str]) -> List[str]:
+            """Reads a product's pages in order, stopping once max_chars_per_product is reached."""
+            pages: List[str] = []
+            total_chars = 0
+            for page_path in page_paths:
+                remaining = max_chars_per_product - total_chars
+                if remaining <= 0:
+                    logger.info(f"Markdown for {name} capped at {max_chars_per_product} chars for suggestion.")
+                    break
+                page_content = load_markdown_page_cached(page_path)
+                if not page_content:
+                    continue
+                if len(page_content) > remaining:
+                    page_content = page_content[:remaining]
+                pages.append(page_content)
+                total_chars += len(page_content)
+            return pages
+
+        def load_pages_by_product(paths_by_product: Dict[str, List[str]]) -> Dict[str, List[str]]:
+            """Reads each product's pages (products in parallel); returns non-empty page contents in order, up to the cap."""
+            if not paths_by_product:
+                return {}
+            with ThreadPoolExecutor(max_workers=min(MARKDOWN_READ_MAX_WORKERS, len(paths_by_product))) as executor:
+                return dict(zip(paths_by_product, executor.map(load_product_pages, paths_by_product, paths_by_product.values())))
+
+        state_page_paths: Dict[str, List[str]] = {}
         for product_name_orig in product_names_to_process:
-            product_md_list: List[str] = []
             prod_from_state = next((p for p in products_list if p.get('name') == product_name_orig), None)
-            product_data_dir = get_product_data_dir(product_name_orig)
-
             if prod_from_state and prod_from_state.get('markdown_docs'):
                 logger.info(f"Using markdown_docs from app_state for {product_name_orig}")
-                for md_doc_info in prod_from_state['markdown_docs']:
-                    for rel_page_path in md_doc_info.get('markdown_pages_paths', []):
-                        if rel_page_path:
-                            abs_page_path = os.path.join(product_data_dir, rel_page_path)
-                            page_content = load_markdown_page(abs_page_path)
-                            if page_content:
-                                product_md_list.append(page_content)
-
-            if not product_md_list:
-                logger.info(f"Trying to load markdown_docs from disk config for {product_name_orig}")
+                product_data_dir = get_product_data_dir(product_name_orig)
+                state_page_paths[product_name_orig] = [
+                    os.path.join(product_data_dir, rel_page_path)
+                    for md_doc_info in prod_from_state['markdown_docs']
+                    for rel_page_path in md_doc_info.get('markdown_pages_paths', [])
+                    if rel_page_path
+                ]
+        md_lists = load_pages_by_product(state_page_paths)
+
+        disk_page_paths: Dict[str, List[str]] = {}
+        for product_name_orig in product_names_to_process:
+            if md_lists.get(product_name_orig):
+                continue
+            logger.info(f"Trying to load markdown_docs from disk config for {product_name_orig}")
+            disk_config = configs_by_product.get(product_name_orig)
+            if disk_config is None:
                 disk_config = load_product_config(product_name_orig) # load_product_config handles name variants
-                if disk_config and disk_config.get('markdown_document_infos'):
-                    for md_doc_info in disk_config['markdown_document_infos']:
-                        for abs_page_path in md_doc_info.get('markdown_pages_paths_absolute', []):
-                            if abs_page_path:
-                                page_content = load_markdown_page(abs_page_path)
-                                if page_content:
-                                    product_md_list.append(page_content)
+            if disk_config and disk_config.get('markdown_document_infos'):
+                disk_page_paths[product_name_orig] = [
+                    abs_page_path
+                    for md_doc_info in disk_config['markdown_document_infos']
+                    for abs_page_path in md_doc_info.get('markdown_pages_paths_absolute', [])
+                    if abs_page_path
+                ]
+        md_lists.update(load_pages_by_product(disk_page_paths))
 
+        for product_name_orig in product_names_to_process:
+            product_md_list = md_lists.get(product_name_orig)
             if product_md_list:
                 logger.info(f"Loaded {len(product_md_list)} markdown pages for {product_name_orig}")
                 all_md_content_map[product_name_orig] = product_md_list
             else:
                 logger.warning(f"No markdown content found for {product_name_orig}")
 
+        stats = cache_stats()
+        logger.info(
+            f"Markdown page cache: {stats['hits']} hits, {stats['misses']} misses "
+            f"({stats['hit_rate']:.0%} hit rate), {stats['size']} pages cached."
+        )
         return all_md_content_map
 
     def format_questions_for_df(questions_list: List[Dict[str, Any]]) -> pd.DataFrame:
         """Formats the list of question dicts into a DataFrame for display."""
         if not questions_list:
-            return pd.DataFrame(columns=["Select", "ID", "Question Text", "Applies to Categories"])
+            return pd.DataFrame({col: pd.array([], dtype=dtype) for col, dtype in QUESTIONS_DF_DTYPES.items()})
 
-        df_data = [
+        return pd.DataFrame.from_records(
             [
-                False,
-                q.get('id', ''),
-                q.get('text', ''),
-                ", ".join(q.get('applies_to_categories', []))
-            ] for q in questions_list
-        ]
-        return pd.DataFrame(df_data, columns=["Select", "ID", "Question Text", "Applies to Categories"])
+                (False, q.get('id', ''), q.get('text', ''), ", ".join(q.get('applies_to_categories', ())))
+                for q in questions_list
+            ],
+            columns=QUESTIONS_DF_COLUMNS,
+        ).astype(QUESTIONS_DF_DTYPES)
 
     def handle_suggest_questions_action(
         current_app_state_value: Dict[str, Any], sample_categories: str, sample_questions: str, model_choice: str
     ) -> Tuple[Dict[str, Any], str, pd.DataFrame, List[str]]:
         """Suggests categories and questions based on processed documents."""
-        all_md_content = get_all_markdown_content_for_suggestion(current_app_state_value)
+        # A product never needs more than one prompt's worth of text for suggestions.
+        all_md_content = get_all_markdown_content_for_suggestion(
+            current_app_state_value, get_prompt_char_budget(model_choice)
+        )
         if not all_md_content:
             questions_config = current_app_state_value.get('questions_config', {"categories": [], "questions": []})
             df_val = format_questions_for_df(questions_config.get('questions', []))
@@ -112,6 +193,7 @@ def create_questions_tab(app_state: gr.State) -> gr.Blocks:
         suggested_config = suggest_categories_and_questions(all_md_content, sample_categories, sample_questions, model_choice)
 
         if suggested_config and suggested_config.get('categories'):
+            suggested_config['categories'].sort()
             updated_app_state = update_and_save_app_state_questions_config(current_app_state_value, suggested_config)
             status = "Successfully suggested categories and questions."
             df_val = format_questions_for_df(suggested_config.get('questions', []))
@@ -134,11 +216,11 @@ def create_questions_tab(app_state: gr.State) -> gr.Blocks:
             return current_app_state_value, "Category name cannot be empty.", current_categories
 
         cleaned_name = new_category_name.strip()
-        if cleaned_name in current_categories:
+        insert_at = bisect.bisect_left(current_categories, cleaned_name) # categories are kept sorted
+        if insert_at < len(current_categories) and current_categories[insert_at] == cleaned_name:
             return current_app_state_value, f"Category '{cleaned_name}' already exists.", current_categories
 
-        current_categories.append(cleaned_name)
-        current_categories.sort()
+        current_categories.insert(insert_at, cleaned_name)
         questions_config['categories'] = current_categories
 
         updated_app_state = update_and_save_app_state_questions_config(current_app_state_value, questions_config)
@@ -180,15 +262,17 @@ def create_questions_tab(app_state: gr.State) -> gr.Blocks:
         if not questions_df_with_selection or 'data' not in questions_df_with_selection or not questions_df_with_selection['data']:
             return current_app_state_value, "No questions data to process for deletion.", format_questions_for_df(original_questions)
 
-        selected_ids_to_delete = [
+        ids_to_delete = frozenset(
             row[1] for row in questions_df_with_selection['data'] if row[0] is True
-        ]
+        )
 
-        if not selected_ids_to_delete:
+        if not ids_to_delete:
             return current_app_state_value, "No questions selected for deletion.", format_questions_for_df(original_questions)
 
-        updated_questions = [q for q in original_questions if q['id'] not in selected_ids_to_delete]
+        updated_questions = [q for q in original_questions if q['id'] not in ids_to_delete]
         num_deleted = len(original_questions) - len(updated_questions)
+        if num_deleted == 0:
+            return current_app_state_value, "Selected questions were not found; nothing deleted.", format_questions_for_df(original_questions)
         questions_config['questions'] = updated_questions
 
         updated_app_state = update_and_save_app_state_questions_config(current_app_state_value, questions_config)
@@ -248,26 +332,30 @@ def create_questions_tab(app_state: gr.State) -> gr.Blocks:
             add_question_button_ui = gr.Button("Add Question")
         question_status_ui = gr.Markdown("")
 
+        def suggest_and_refresh_categories(
+            current_app_state_value: Dict[str, Any], sample_categories: str, sample_questions: str, model_choice: str
+        ):
+            """Runs the suggestion and refreshes both category pickers in the same event."""
+            new_state, status, df_val, cats = handle_suggest_questions_action(
+                current_app_state_value, sample_categories, sample_questions, model_choice
+            )
+            return new_state, status, df_val, gr.CheckboxGroup(choices=cats, value=cats), gr.CheckboxGroup(choices=cats)
+
+        def add_category_and_refresh(current_app_state_value: Dict[str, Any], new_category_name: str):
+            """Adds the category, refreshes both category pickers and clears the name box in the same event."""
+            new_state, status, cats = add_category_action(current_app_state_value, new_category_name)
+            return new_state, status, gr.CheckboxGroup(choices=cats, value=cats), gr.CheckboxGroup(choices=cats), gr.Textbox(value="")
+
         suggest_button_ui.click(
-            handle_suggest_questions_action,
+            suggest_and_refresh_categories,
             inputs=[app_state, sample_categories_ui, sample_questions_ui, model_choice_ui],
-            outputs=[app_state, suggestion_status_ui, current_questions_df_ui, current_categories_ui]
-        ).then(
-            lambda current_app_state_val: gr.CheckboxGroup(choices=current_app_state_val.get('questions_config', {}).get('categories', [])),
-            inputs=[app_state],
-            outputs=[new_question_categories_ui]
+            outputs=[app_state, suggestion_status_ui, current_questions_df_ui, current_categories_ui, new_question_categories_ui]
         )
 
         add_category_button_ui.click(
-            add_category_action,
+            add_category_and_refresh,
             inputs=[app_state, new_category_name_ui],
-            outputs=[app_state, category_status_ui, current_categories_ui]
-        ).then(
-            lambda current_app_state_val: gr.CheckboxGroup(choices=current_app_state_val.get('questions_config', {}).get('categories', [])),
-            inputs=[app_state],
-            outputs=[new_question_categories_ui]
-        ).then(
-            lambda: gr.Textbox(value=""), outputs=[new_category_name_ui]
+            outputs=[app_state, category_status_ui, current_categories_ui, new_question_categories_ui, new_category_name_ui]
         )
 
         current_categories_ui.change(
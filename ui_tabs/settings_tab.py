@@ -2,14 +2,9 @@
 from typing import Tuple
 
 import gradio as gr
-from azure.ai.documentintelligence import DocumentIntelligenceClient
-from azure.core.credentials import AzureKeyCredential
-from openai import AzureOpenAI
-
-from config import (AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT,
-                   AZURE_DOCUMENT_INTELLIGENCE_KEY, AZURE_OPENAI_API_KEY,
-                   AZURE_OPENAI_API_VERSION, AZURE_OPENAI_ENDPOINT,
-                   AZURE_OPENAI_REASONING_MODEL_DEPLOYMENT,
+
+from azure_clients import get_di_client, get_openai_client, invalidate_clients
+from config import (AZURE_OPENAI_REASONING_MODEL_DEPLOYMENT,
                    AZURE_OPENAI_NONREASONING_MODEL_DEPLOYMENT, logger)
 from local_storage import load_settings, save_settings
 
@@ -17,24 +12,13 @@ from local_storage import load_settings, save_settings
 def create_settings_tab() -> gr.Blocks:
     """Creates the Gradio UI for the Settings tab."""
 
-    _azure_openai_client = None
-    _document_intelligence_client = None
-
     def initialize_clients():
-        nonlocal _azure_openai_client, _document_intelligence_client
-        try:
-            _azure_openai_client = AzureOpenAI(
-                api_key=AZURE_OPENAI_API_KEY,
-                api_version=AZURE_OPENAI_API_VERSION,
-                azure_endpoint=AZURE_OPENAI_ENDPOINT
-            )
-            _document_intelligence_client = DocumentIntelligenceClient(
-                endpoint=AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT,
-                credential=AzureKeyCredential(AZURE_DOCUMENT_INTELLIGENCE_KEY)
-            )
+        invalidate_clients()
+        openai_client = get_openai_client()
+        di_client = get_di_client()
+        if openai_client and di_client:
             return "✅ Successfully initialized Azure clients"
-        except Exception as e:
-            return f"❌ Failed to initialize Azure clients: {str(e)}"
+        return "❌ Failed to initialize Azure clients. Check the settings above and the logs."
 
     def handle_save_settings_action(
         endpoint_openai: str, key_openai: str, version_openai: str,
@@ -42,8 +26,6 @@ def create_settings_tab() -> gr.Blocks:
         endpoint_di: str, key_di: str
     ) -> str:
         """Saves settings to local file and resets client instances."""
-        nonlocal _azure_openai_client, _document_intelligence_client
-
         new_settings = {
             "azure_openai_endpoint": endpoint_openai.strip(),
             "azure_openai_api_key": key_openai,
@@ -55,8 +37,7 @@ def create_settings_tab() -> gr.Blocks:
         }
         save_settings(new_settings)
 
-        _azure_openai_client = None
-        _document_intelligence_client = None
+        invalidate_clients()
         logger.info("Settings saved. Azure clients will be re-initialized on next use.")
         return "Settings saved successfully. Clients will use new settings on their next operation."
 
@@ -1,81 +1,237 @@
 """
 Common utility functions for the Insurance Comparison Assistant.
 """
+import asyncio
+import functools
 import os
 import re
-from typing import Any, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
 
-import requests
+import aiohttp
 
 from config import logger
 
+DOWNLOAD_CHUNK_SIZE = 65536
+DOWNLOAD_TIMEOUT_SECONDS = 30
+DOWNLOAD_CONNECT_TIMEOUT_SECONDS = 5
+DOWNLOAD_HEAD_TIMEOUT_SECONDS = 10
+DOWNLOAD_MAX_RETRIES = 3
+DOWNLOAD_RETRY_BACKOFF_SECONDS = 0.3
+DOWNLOAD_RETRY_STATUSES = frozenset({502, 503, 504})
+DOWNLOAD_POOL_MAX_SIZE = 64
+MAX_CONCURRENT_DOWNLOADS = 16
+ERROR_BODY_MAX_CHARS = 512
+
+_RE_NONWORD = re.compile(r'[^\w\s-]')
+_RE_COLLAPSE = re.compile(r'[-\s]+')
+
 
 def clean_filename(filename: str) -> str:
     """Cleans a filename to be safe for filesystem operations."""
     if not isinstance(filename, str):
         filename = str(filename)
-    filename = re.sub(r'[^\w\s-]', '', filename).strip()
-    filename = re.sub(r'[-\s]+', '_', filename)
-    return filename
+    filename = _RE_NONWORD.sub('', filename).strip()
+    return _RE_COLLAPSE.sub('_', filename)
 
 
-def download_pdf(url: str, product_name: str, doc_name: str) -> Optional[str]:
-    """Downloads a PDF from a URL and saves it locally."""
-    from local_storage import get_product_data_dir
+def _read_text_file(path: str, size: int) -> str:
+    """Reads a whole UTF-8 file with one os.read call, normalizing newlines like text mode does."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        data = os.read(fd, size)
+    finally:
+        os.close(fd)
+    text = data.decode("utf-8")
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
 
-    product_dir = get_product_data_dir(product_name)
-    os.makedirs(product_dir, exist_ok=True)
+@functools.lru_cache(maxsize=4096)
+def _cached_markdown_page(abs_path: str, mtime_ns: int, size: int) -> Optional[str]:
+    try:
+        return _read_text_file(abs_path, size)
+    except (OSError, UnicodeDecodeError):
+        from local_storage import load_markdown_page
+        return load_markdown_page(abs_path)
+
+
+def load_markdown_page_cached(abs_path: str) -> Optional[str]:
+    """Loads a markdown page, served from memory while its mtime and size are unchanged."""
+    try:
+        stat_result = os.stat(abs_path)
+    except OSError:
+        from local_storage import load_markdown_page
+        return load_markdown_page(abs_path)
+    return _cached_markdown_page(abs_path, stat_result.st_mtime_ns, stat_result.st_size)
+
+
+def cache_stats() -> Dict[str, Any]:
+    """Returns hit/miss counts and hit rate of the markdown page cache."""
+    info = _cached_markdown_page.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "hit_rate": info.hits / lookups if lookups else 0.0,
+    }
+
+
+def get_pdf_download_path(product_name: str, doc_name: str) -> str:
+    """Returns the local path a product's PDF document is downloaded to."""
+    from local_storage import get_product_data_dir
 
     safe_doc_name = clean_filename(doc_name)
     if not safe_doc_name.lower().endswith(".pdf"):
         safe_doc_name += ".pdf"
+    return os.path.join(get_product_data_dir(product_name), safe_doc_name)
 
-    filepath = os.path.join(product_dir, safe_doc_name)
 
+async def _is_cached_copy_current(session: aiohttp.ClientSession, url: str, filepath: str) -> bool:
+    """True if filepath exists and its size equals the Content-Length the server reports for url."""
+    try:
+        local_size = os.path.getsize(filepath)
+    except OSError:
+        return False
     try:
-        logger.info(f"Downloading PDF from {url} to {filepath}...")
-        response = requests.get(url, stream=True, timeout=30)
-        response.raise_for_status()
-        with open(filepath, "wb") as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-        logger.info(f"Successfully downloaded {filepath}")
-        return filepath
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error downloading PDF from {url}: {e}")
-    except IOError as e:
-        logger.error(f"Error saving PDF to {filepath}: {e}")
+        async with session.head(url, allow_redirects=True, timeout=aiohttp.ClientTimeout(total=DOWNLOAD_HEAD_TIMEOUT_SECONDS)) as response:
+            if response.status >= 400 or response.content_length is None:
+                return False
+            return response.content_length > 0 and response.content_length == local_size
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.debug(f"HEAD request failed for {url} ({e}); downloading in full.")
+        return False
+
+
+async def _download_pdf_async(
+    session: aiohttp.ClientSession, semaphore: asyncio.Semaphore, url: str, product_name: str, doc_name: str
+) -> Optional[str]:
+    """Streams one PDF to its product directory; at most `semaphore` downloads run at once."""
+    filepath = get_pdf_download_path(product_name, doc_name)
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+
+    async with semaphore:
+        if await _is_cached_copy_current(session, url, filepath):
+            logger.info(f"Skipping download; cached copy matches Content-Length: {filepath}")
+            return filepath
+        for attempt in range(DOWNLOAD_MAX_RETRIES + 1):
+            retry_delay = DOWNLOAD_RETRY_BACKOFF_SECONDS * (2 ** attempt)
+            can_retry = attempt < DOWNLOAD_MAX_RETRIES
+            try:
+                logger.info(f"Downloading PDF from {url} to {filepath}...")
+                async with session.get(url) as response:
+                    retry_status = response.status if response.status in DOWNLOAD_RETRY_STATUSES and can_retry else None
+                    if retry_status is None:
+                        response.raise_for_status()
+                        with open(filepath, "wb") as f:
+                            async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                                f.write(chunk)
+                if retry_status is not None:
+                    logger.warning(f"Got HTTP {retry_status} for {url}; retrying in {retry_delay:.1f}s.")
+                    await asyncio.sleep(retry_delay)
+                    continue
+                logger.info(f"Successfully downloaded {filepath}")
+                return filepath
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if can_retry:
+                    logger.warning(f"Connection error downloading {url} ({e}); retrying in {retry_delay:.1f}s.")
+                    await asyncio.sleep(retry_delay)
+                    continue
+                logger.error(f"Error downloading PDF from {url}: {e}")
+            except aiohttp.ClientError as e:
+                logger.error(f"Error downloading PDF from {url}: {e}")
+            except IOError as e:
+                logger.error(f"Error saving PDF to {filepath}: {e}")
+            break
     return None
 
 
+async def download_pdfs_async(
+    jobs: List[Tuple[str, str, str]],
+    on_complete: Optional[Callable[[int, Optional[str]], None]] = None
+) -> List[Optional[str]]:
+    """
+    Downloads (url, product_name, doc_name) jobs concurrently over one HTTP session.
+    Returns the local paths (None on failure) in job order; on_complete(index, path)
+    is called as each download finishes.
+    """
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+    timeout = aiohttp.ClientTimeout(
+        total=None, sock_connect=DOWNLOAD_CONNECT_TIMEOUT_SECONDS, sock_read=DOWNLOAD_TIMEOUT_SECONDS
+    )
+    connector = aiohttp.TCPConnector(limit=DOWNLOAD_POOL_MAX_SIZE, limit_per_host=MAX_CONCURRENT_DOWNLOADS)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        async def run(index: int, job: Tuple[str, str, str]) -> Optional[str]:
+            path = await _download_pdf_async(session, semaphore, *job)
+            if on_complete:
+                on_complete(index, path)
+            return path
+
+        return list(await asyncio.gather(*(run(i, job) for i, job in enumerate(jobs))))
+
+
 def get_document_name_from_url(url: str) -> str:
     """Extracts a document name from a URL, ensuring it ends with .pdf."""
     try:
-        filename = os.path.basename(url.split('?')[0].split('#')[0])
-        if not filename: # If URL ends with / or is just domain
-            filename = "document"
-
-        name_part, ext_part = os.path.splitext(filename)
-        if not ext_part or ext_part.lower() != ".pdf":
-            filename = name_part + ".pdf"
-
-        return filename if filename != ".pdf" else "document.pdf"
+        base = os.path.basename(urlparse(url).path) or "document" # URL ends with / or is just domain
+        name_part, ext_part = os.path.splitext(base)
+        if not name_part:
+            name_part = "document"
+        if ext_part.lower() != ".pdf":
+            return f"{name_part}.pdf"
+        return base
     except Exception as e:
         logger.warning(f"Could not parse document name from URL '{url}': {e}. Using fallback.")
         return "document.pdf"
 
 
+def _response_text_preview(response: Any, limit: int = ERROR_BODY_MAX_CHARS) -> str:
+    """
+    Returns at most limit characters of a response body. Streaming-capable responses
+    (httpx/azure-core iter_bytes, requests iter_content) are read only up to limit bytes;
+    otherwise falls back to slicing the response text.
+    """
+    iter_body = getattr(response, "iter_bytes", None)
+    if iter_body is None and hasattr(response, "iter_content"):
+        iter_body = functools.partial(response.iter_content, chunk_size=limit)
+    if callable(iter_body):
+        try:
+            head = bytearray()
+            for chunk in iter_body():
+                head += chunk
+                if len(head) >= limit:
+                    break
+            return bytes(head[:limit]).decode("utf-8", errors="replace")
+        except Exception:
+            pass # Stream already consumed or unsupported; fall back to the decoded text.
+
+    try:
+        text = response.text() if callable(response.text) else response.text
+    except Exception:
+        return ""
+    return text[:limit] if text else ""
+
+
 def format_error_message(error_details: Any) -> str:
     """Formats an error message for display, attempting to be informative."""
     if isinstance(error_details, str):
         return error_details
     if isinstance(error_details, Exception):
-        if hasattr(error_details, 'response') and error_details.response is not None:
-            try:
-                err_json = error_details.response.json()
-                if 'error' in err_json and 'message' in err_json['error']:
-                    return f"API Error: {err_json['error']['message']} (Status: {error_details.response.status_code})"
-            except ValueError:
-                return f"API Error: {error_details.response.text} (Status: {error_details.response.status_code})"
+        response = getattr(error_details, 'response', None)
+        if response is not None:
+            status_code = getattr(response, 'status_code', None)
+            headers = getattr(response, 'headers', None) or {}
+            content_type = (headers.get("content-type") or "").lower()
+            if "json" in content_type and hasattr(response, "json"):
+                try:
+                    err_json = response.json()
+                    if isinstance(err_json, dict) and isinstance(err_json.get('error'), dict) and err_json['error'].get('message'):
+                        return f"API Error: {err_json['error']['message']} (Status: {status_code})"
+                except ValueError:
+                    return f"API Error: {_response_text_preview(response)} (Status: {status_code})"
+            else:
+                return f"API Error: {_response_text_preview(response)} (Status: {status_code})"
         return f"An error occurred: {str(error_details)}"
     return f"An unknown error occurred: {str(error_details)}"